@@ -3,35 +3,108 @@ from __future__ import annotations
 
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import CONF_HOST, CONF_PASSWORD, CONF_USERNAME, Platform
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
 
-from .const import DOMAIN
+from .const import (
+    DATA_SCHEDULER,
+    DEFAULT_PARSE_MODE,
+    DEFAULT_POOL_SIZE,
+    DOMAIN,
+    OPTIONS_PARSE_MODE,
+    OPTIONS_POOL_SIZE,
+    PARSE_MODE_PROCESS,
+    STORAGE_KEY_AUTH,
+    STORAGE_KEY_TRAFFIC,
+    STORAGE_VERSION,
+)
 from .coordinator import CudyRouterDataUpdateCoordinator
 from .router import CudyRouter
+from .scheduler import async_get_scheduler
 
-PLATFORMS: list[Platform] = [Platform.SENSOR]
+PLATFORMS: list[Platform] = [Platform.DEVICE_TRACKER, Platform.SENSOR]
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up Cudy Router from a config entry."""
 
     data = entry.data
-    api = CudyRouter(hass, data[CONF_HOST], data[CONF_USERNAME], data[CONF_PASSWORD])
-    coordinator = CudyRouterDataUpdateCoordinator(hass, entry, api)
-    await coordinator.async_config_entry_first_refresh()
+    scheduler = async_get_scheduler(hass)
+    parse_mode = entry.options.get(OPTIONS_PARSE_MODE) or DEFAULT_PARSE_MODE
+    api = CudyRouter(
+        hass,
+        data[CONF_HOST],
+        data[CONF_USERNAME],
+        data[CONF_PASSWORD],
+        int(entry.options.get(OPTIONS_POOL_SIZE) or DEFAULT_POOL_SIZE),
+        scheduler.parses,
+        parse_mode,
+        scheduler.async_get_process_pool()
+        if parse_mode == PARSE_MODE_PROCESS
+        else None,
+    )
+    coordinator = CudyRouterDataUpdateCoordinator(hass, entry, api, scheduler)
+    try:
+        await api.async_restore_auth(
+            Store(
+                hass, STORAGE_VERSION, STORAGE_KEY_AUTH.format(entry_id=entry.entry_id)
+            )
+        )
+        await coordinator.async_restore_traffic(
+            Store(
+                hass,
+                STORAGE_VERSION,
+                STORAGE_KEY_TRAFFIC.format(entry_id=entry.entry_id),
+            )
+        )
+        await coordinator.async_config_entry_first_refresh()
+    except Exception:
+        _async_release_scheduler(hass, entry)
+        raise
 
     hass.data.setdefault(DOMAIN, {})[entry.entry_id] = coordinator
 
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    entry.async_on_unload(entry.add_update_listener(async_update_options))
 
     return True
 
 
+async def async_update_options(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Reload the config entry to apply the changed options."""
+
+    await hass.config_entries.async_reload(entry.entry_id)
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
 
     if unload_ok := await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
-        hass.data[DOMAIN].pop(entry.entry_id)
-        if not hass.data[DOMAIN]:
-            del hass.data[DOMAIN]
+        coordinator: CudyRouterDataUpdateCoordinator = hass.data[DOMAIN].pop(
+            entry.entry_id
+        )
+        await coordinator.async_save_traffic()
+        _async_release_scheduler(hass, entry)
     return unload_ok
+
+
+@callback
+def _async_release_scheduler(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Frees the slot of the entry, and the scheduler after the last entry."""
+
+    scheduler = async_get_scheduler(hass)
+    scheduler.async_unregister(entry.entry_id)
+    if not scheduler.routers:
+        scheduler.async_shutdown()
+        hass.data[DOMAIN].pop(DATA_SCHEDULER)
+    if not hass.data[DOMAIN]:
+        del hass.data[DOMAIN]
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove the stored session and traffic of a deleted config entry."""
+
+    for key in (STORAGE_KEY_AUTH, STORAGE_KEY_TRAFFIC):
+        await Store(
+            hass, STORAGE_VERSION, key.format(entry_id=entry.entry_id)
+        ).async_remove()
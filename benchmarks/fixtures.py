@@ -0,0 +1,166 @@
+"""Recorded and generated Cudy router pages and values used by the benchmarks"""
+
+from __future__ import annotations
+
+from datetime import date, datetime
+from pathlib import Path
+import random
+
+from dateutil.relativedelta import relativedelta
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+MODEM_STATUS = "modem_status.html"
+MODEM_STATUS_DETAIL = "modem_status_detail.html"
+
+DEVICE_COUNTS = (10, 100, 1000)
+
+# Connected Time values as shown by the modem status page, and their seconds
+# counted back from DURATIONS_TODAY (a month before is Feb 29, a leap day)
+DURATIONS_TODAY = date(2024, 3, 31)
+DURATIONS = (
+    ("00:00:07", 7),
+    ("12:34:56", 45296),
+    ("0 Days 00:00:00", 0),
+    ("1 Day 00:00:01", 86401),
+    ("3 Days 04:05:06", 273906),
+    ("2 Weeks 1 Day 23:59:59", 1382399),
+    ("1 Month 00:00:00", 31 * 86400),
+    ("1 Month 2 Days 10:11:12", 2887872),
+    ("5 Months 3 Weeks 6 Days 01:02:03", 15469323),
+    ("1 Year 00:00:00", 366 * 86400),
+    ("4 Years 00:00:00", 1461 * 86400),
+    ("1 Year 11 Months 4 Weeks 06:07:08", 63007628),
+)
+# Randomly generated Connected Time values checked against relativedelta
+GENERATED_DURATIONS = 20000
+DURATION_UNITS = ("Year", "Month", "Week", "Day")
+
+DEVLIST_HEADER = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>LT18 - Devices - LuCI</title>
+<link rel="stylesheet" href="/luci-static/bootstrap/cascade.css">
+</head>
+<body class="lang_en">
+<div id="maincontent" class="container">
+<div class="panel panel-default">
+<div class="panel-heading"><h3 class="panel-title">Devices</h3></div>
+<div class="panel-body">
+<table class="table" id="cbi-table-devlist">
+<tr class="cbi-section-table-titles">
+<th>Hostname</th><th>IP / MAC</th><th>Upload / Download</th><th>Connection</th>
+</tr>
+"""
+
+DEVLIST_ROW = """<tr class="cbi-section-table-row" id="cbi-table-{index}">
+<td class="col-xs-4"><div id="cbi-table-{index}-hostname">
+<p class="visible-xs">{hostname}<br>{interface}</p>
+<p class="hidden-xs">{hostname}</p>
+</div></td>
+<td class="col-xs-3"><div id="cbi-table-{index}-ipmac">
+<p class="visible-xs">{ip}<br>{mac}</p>
+<p class="hidden-xs">{ip} / {mac}</p>
+</div></td>
+<td class="col-xs-3"><div id="cbi-table-{index}-speed">
+<p class="visible-xs">{up_speed}<br>{down_speed}</p>
+<p class="hidden-xs">{up_speed} / {down_speed}</p>
+</div></td>
+<td class="col-xs-2"><div id="cbi-table-{index}-online">
+<p class="visible-xs">{online}</p>
+</div></td>
+</tr>
+"""
+
+DEVLIST_FOOTER = """</table>
+</div>
+</div>
+</div>
+</body>
+</html>
+"""
+
+HOSTNAMES = ("android", "iphone", "laptop", "desktop", "tv", "printer", "camera")
+INTERFACES = ("2.4G WiFi", "5G WiFi", "LAN")
+SPEED_UNITS = ("bps", "Kbps", "Mbps")
+
+
+def load_page(name: str) -> str:
+    """Returns a recorded page"""
+
+    return (FIXTURES_DIR / name).read_text(encoding="utf-8")
+
+
+def _speed(rng: random.Random) -> str:
+    return f"{rng.uniform(0, 999):.2f} {rng.choice(SPEED_UNITS)}"
+
+
+def devlist_page(
+    client_count: int, seed: int = 0, speeds_seed: int | None = None
+) -> str:
+    """Generates a device list page with the given number of clients
+
+    The same seeds always produce the same page. With a speeds seed, the
+    clients stay the same and only their speeds depend on it.
+    """
+
+    rng = random.Random(seed)
+    speeds_rng = rng if speeds_seed is None else random.Random(speeds_seed)
+    rows = [
+        DEVLIST_ROW.format(
+            index=index + 1,
+            hostname=f"{rng.choice(HOSTNAMES)}-{index:04d}",
+            interface=rng.choice(INTERFACES),
+            ip=f"192.168.{10 + index // 250}.{2 + index % 250}",
+            mac=":".join(f"{rng.randrange(256):02X}" for _ in range(6)),
+            up_speed=_speed(speeds_rng),
+            down_speed=_speed(speeds_rng),
+            online=f"{rng.randrange(1, 72)}h {rng.randrange(60)}m",
+        )
+        for index in range(client_count)
+    ]
+    return DEVLIST_HEADER + "".join(rows) + DEVLIST_FOOTER
+
+
+def generated_durations(count: int, seed: int = 0) -> list[tuple[str, date, int]]:
+    """Generates Connected Time values, their day and their expected seconds
+
+    The values are in the format of the modem status page, with any of the
+    units before the time. The seconds are counted back from the day with
+    relativedelta, independently of the integration.
+    """
+
+    rng = random.Random(seed)
+    cases: list[tuple[str, date, int]] = []
+    for _ in range(count):
+        today = date.fromordinal(
+            rng.randint(date(2000, 1, 1).toordinal(), date(2040, 12, 31).toordinal())
+        )
+        counts = {
+            unit: rng.choice((0, 1, rng.randrange(2, 12)))
+            for unit in DURATION_UNITS
+            if rng.random() < 0.5
+        }
+        hours = rng.randrange(24)
+        minutes = rng.randrange(60)
+        seconds = rng.randrange(60)
+        text = " ".join(
+            [
+                f"{number} {unit}{'' if number == 1 else 's'}"
+                for unit, number in counts.items()
+            ]
+            + [f"{hours:02d}:{minutes:02d}:{seconds:02d}"]
+        )
+        now = datetime.combine(today, datetime.min.time())
+        start = now - relativedelta(
+            years=counts.get("Year", 0),
+            months=counts.get("Month", 0),
+            weeks=counts.get("Week", 0),
+            days=counts.get("Day", 0),
+            hours=hours,
+            minutes=minutes,
+            seconds=seconds,
+        )
+        cases.append((text, today, int((now - start).total_seconds())))
+    return cases
@@ -0,0 +1,209 @@
+"""Polls mock routers with the coordinators of the integration
+
+Usage: python benchmarks/load.py [--routers N] [--duration SECONDS] ...
+
+Starts the mock routers and one coordinator per router in a bare Home
+Assistant instance, like config entries set up together at startup. Reports
+end-to-end poll latency, throughput, failures, event loop lag and what the
+routers served.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from collections.abc import Callable
+import statistics
+import tempfile
+import time
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import (
+    CONF_HOST,
+    CONF_PASSWORD,
+    CONF_SCAN_INTERVAL,
+    CONF_USERNAME,
+)
+from homeassistant.core import HomeAssistant
+
+from mock_router import add_config_arguments, config_from_arguments, start_routers
+from run import load_integration
+
+LAG_SAMPLE_INTERVAL = 0.1
+
+# Spawned parse workers import this module first, this lets them unpickle the
+# parser functions of the integration
+load_integration("parser")
+
+
+def percentiles(values: list[float]) -> str:
+    """Formats the p50/p95/p99 of the values in milliseconds"""
+
+    if len(values) < 2:
+        return "n/a"
+    quantiles = statistics.quantiles(values, n=100, method="inclusive")
+    return " / ".join(f"{quantiles[q] * 1000:.1f}" for q in (49, 94, 98))
+
+
+def timed(
+    function: Callable[..., Any], polls: list[tuple[float, float]]
+) -> Callable[..., Any]:
+    """Wraps the coroutine function to record its start times and durations"""
+
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        start = time.monotonic()
+        try:
+            return await function(*args, **kwargs)
+        finally:
+            polls.append((start, time.monotonic() - start))
+
+    return wrapper
+
+
+async def sample_loop_lag(lags: list[float], stop: asyncio.Event) -> None:
+    """Measures how late the event loop wakes up a sleeping task"""
+
+    while not stop.is_set():
+        start = time.monotonic()
+        await asyncio.sleep(LAG_SAMPLE_INTERVAL)
+        lags.append(time.monotonic() - start - LAG_SAMPLE_INTERVAL)
+
+
+async def run(options: argparse.Namespace) -> None:
+    """Runs the load test"""
+
+    const = load_integration("const")
+    router_module = load_integration("router")
+    coordinator_module = load_integration("coordinator")
+    scheduler_module = load_integration("scheduler")
+
+    config = config_from_arguments(options)
+    routers, runners = await start_routers(options.routers, options.port, config)
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        scheduler = scheduler_module.async_get_scheduler(hass)
+        polls: list[tuple[float, float]] = []
+        coordinators = []
+        for index in range(options.routers):
+            host = f"127.0.0.1:{options.port + index}"
+            entry = ConfigEntry(
+                version=1,
+                domain=const.DOMAIN,
+                title=host,
+                data={
+                    CONF_HOST: host,
+                    CONF_USERNAME: config.username,
+                    CONF_PASSWORD: config.password,
+                },
+                source="user",
+                options={
+                    CONF_SCAN_INTERVAL: options.scan_interval,
+                    const.OPTIONS_DEVICES_SCAN_INTERVAL: options.devices_scan_interval,
+                    const.OPTIONS_AUTO_DISCOVERY: options.auto_discovery,
+                    const.OPTIONS_POOL_SIZE: options.pool_size,
+                    const.OPTIONS_PARSE_MODE: options.parse_mode,
+                },
+            )
+            api = router_module.CudyRouter(
+                hass,
+                host,
+                config.username,
+                config.password,
+                options.pool_size,
+                scheduler.parses,
+                options.parse_mode,
+                scheduler.async_get_process_pool()
+                if options.parse_mode == const.PARSE_MODE_PROCESS
+                else None,
+            )
+            api.get_data = timed(api.get_data, polls)
+            coordinators.append(
+                coordinator_module.CudyRouterDataUpdateCoordinator(
+                    hass, entry, api, scheduler
+                )
+            )
+
+        lags: list[float] = []
+        stop = asyncio.Event()
+        lag_task = asyncio.create_task(sample_loop_lag(lags, stop))
+
+        print(f"Setting up {options.routers} router(s)")
+        setup_start = time.monotonic()
+        await asyncio.gather(*(c.async_refresh() for c in coordinators))
+        setup_end = time.monotonic()
+        failures = sum(not c.last_update_success for c in coordinators)
+
+        def count_failure(coordinator: Any) -> Callable[[], None]:
+            def listener() -> None:
+                nonlocal failures
+                if not coordinator.last_update_success:
+                    failures += 1
+
+            return listener
+
+        unsubscribes = [
+            coordinator.async_add_listener(count_failure(coordinator))
+            for coordinator in coordinators
+        ]
+        print(f"Polling for {options.duration} seconds")
+        await asyncio.sleep(options.duration)
+
+        stop.set()
+        await lag_task
+        for unsubscribe in unsubscribes:
+            unsubscribe()
+        for coordinator in coordinators:
+            await coordinator.async_shutdown()
+        scheduler.async_shutdown()
+        await hass.async_stop(force=True)
+
+    for runner in runners:
+        await runner.cleanup()
+
+    # Polls after the setup, started within the same second, show how well they
+    # are spread out
+    starts = [start for start, _ in polls if start >= setup_end]
+    latencies = [duration for start, duration in polls if start >= setup_end]
+    busiest_second = max(
+        (sum(1 for other in starts if start <= other < start + 1) for start in starts),
+        default=0,
+    )
+    stats = [router.stats for router in routers]
+    print(f"Setup of all routers:       {(setup_end - setup_start) * 1000:.0f} ms")
+    print(f"Polls after setup:          {len(latencies)}")
+    print(f"Polls per second:           {len(latencies) / options.duration:.2f}")
+    print(f"Most polls started in 1 s:  {busiest_second}")
+    print(f"Failed refreshes:           {failures}")
+    print(f"Poll p50/p95/p99 ms:        {percentiles(latencies)}")
+    print(f"Loop lag p50/p95/p99 ms:    {percentiles(lags)}")
+    print(f"Max loop lag ms:            {max(lags, default=0) * 1000:.1f}")
+    print(f"Logins:                     {sum(s.logins for s in stats)}")
+    print(f"Pages served:               {sum(s.pages for s in stats)}")
+    print(f"403 responses:              {sum(s.forbidden for s in stats)}")
+    print(f"500 responses:              {sum(s.errors for s in stats)}")
+    print(f"MB sent:                    {sum(s.bytes_sent for s in stats) / 1e6:.2f}")
+    print(f"Max concurrent per router:  {max(s.max_concurrent for s in stats)}")
+    print(f"Max queued polls:           {scheduler.polls.max_waiting}")
+    print(f"Max queued parses:          {scheduler.parses.max_waiting}")
+
+
+def main() -> None:
+    """Starts the load test from the command line"""
+
+    arguments = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_config_arguments(arguments)
+    arguments.add_argument("--duration", type=float, default=60, help="seconds")
+    arguments.add_argument("--scan-interval", type=int, default=15)
+    arguments.add_argument("--devices-scan-interval", type=int, default=60)
+    arguments.add_argument("--pool-size", type=int, default=2)
+    arguments.add_argument("--auto-discovery", action="store_true")
+    arguments.add_argument(
+        "--parse-mode", choices=("inline", "executor", "process"), default="inline"
+    )
+    asyncio.run(run(arguments.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
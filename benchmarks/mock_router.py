@@ -0,0 +1,270 @@
+"""Local stand-in for Cudy routers, serving the pages used by the integration
+
+Usage: python benchmarks/mock_router.py [--routers N] [--port PORT] ...
+
+Emulates the LuCI login (sysauth cookie, 403 once the session expired), the
+gcom/status pages and the device list. Latency, error rate, client count and
+how often the pages change can be configured. Every router listens on its
+own port, starting from the given one.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from dataclasses import dataclass, field
+import random
+import secrets
+
+from aiohttp import web
+
+from fixtures import (
+    MODEM_STATUS,
+    MODEM_STATUS_DETAIL,
+    devlist_page,
+    load_page,
+)
+
+LOGIN_PATH = "/cgi-bin/luci"
+MODEM_PATH = "/cgi-bin/luci/admin/network/gcom/status"
+DEVICES_PATH = "/cgi-bin/luci/admin/network/devices/devlist"
+
+
+@dataclass
+class MockRouterConfig:
+    """Behaviour of a mock router."""
+
+    username: str = "admin"
+    password: str = "admin"
+    clients: int = 20
+    # Seconds before answering, with uniform jitter of the given fraction
+    latency: float = 0.05
+    latency_jitter: float = 0.5
+    # Probability of answering a page request with 500
+    error_rate: float = 0.0
+    # Sessions expire after this many seconds, None for never
+    session_lifetime: float | None = 3600
+    # LuCI doesn't tell the lifetime, the client finds out from a 403
+    cookie_max_age: bool = False
+    # Probability that the speeds in the device list changed since the last
+    # request; the clients stay the same
+    change_rate: float = 1.0
+    # Without the detail page (older firmware), ?detail=1 returns the summary
+    detail_page: bool = True
+    seed: int = 0
+
+
+@dataclass
+class MockRouterStats:
+    """Requests served by a mock router."""
+
+    logins: int = 0
+    failed_logins: int = 0
+    pages: int = 0
+    forbidden: int = 0
+    errors: int = 0
+    bytes_sent: int = 0
+    concurrent: int = 0
+    max_concurrent: int = 0
+
+
+@dataclass
+class MockRouter:
+    """A single emulated router."""
+
+    config: MockRouterConfig = field(default_factory=MockRouterConfig)
+    stats: MockRouterStats = field(default_factory=MockRouterStats)
+
+    def __post_init__(self) -> None:
+        """Initialize."""
+        self._random = random.Random(self.config.seed)
+        self._sessions: dict[str, float] = {}
+        self._summary = load_page(MODEM_STATUS)
+        self._detail = (
+            load_page(MODEM_STATUS_DETAIL) if self.config.detail_page else self._summary
+        )
+        self._devlist_version = 0
+        self._devlist = devlist_page(self.config.clients, self.config.seed)
+
+    def application(self) -> web.Application:
+        """Returns the web application of the router"""
+
+        app = web.Application()
+        app.router.add_route("HEAD", "/", self._handle_root)
+        app.router.add_post(LOGIN_PATH, self._handle_login)
+        app.router.add_get(MODEM_PATH, self._handle_modem)
+        app.router.add_get(DEVICES_PATH, self._handle_devices)
+        return app
+
+    async def _delay(self) -> None:
+        jitter = self.config.latency * self.config.latency_jitter
+        await asyncio.sleep(
+            max(self.config.latency + self._random.uniform(-jitter, jitter), 0)
+        )
+
+    async def _handle_root(self, request: web.Request) -> web.Response:
+        return web.Response(status=200)
+
+    async def _handle_login(self, request: web.Request) -> web.Response:
+        await self._delay()
+        form = await request.post()
+        if (
+            form.get("luci_username") != self.config.username
+            or form.get("luci_password") != self.config.password
+        ):
+            self.stats.failed_logins += 1
+            return web.Response(status=403, text="Invalid username and/or password")
+
+        self.stats.logins += 1
+        token = secrets.token_hex(16)
+        lifetime = self.config.session_lifetime
+        loop = asyncio.get_running_loop()
+        self._sessions[token] = loop.time() + (lifetime or float("inf"))
+        response = web.Response(
+            status=302, headers={"Location": f"{LOGIN_PATH}/admin/status"}
+        )
+        response.set_cookie(
+            "sysauth",
+            token,
+            path=LOGIN_PATH,
+            httponly=True,
+            max_age=int(lifetime) if lifetime and self.config.cookie_max_age else None,
+        )
+        return response
+
+    def _authorized(self, request: web.Request) -> bool:
+        token = request.cookies.get("sysauth")
+        expires = token and self._sessions.get(token)
+        if not expires:
+            return False
+        if asyncio.get_running_loop().time() >= expires:
+            del self._sessions[token]
+            return False
+        return True
+
+    async def _page(self, request: web.Request, body: str) -> web.Response:
+        self.stats.concurrent += 1
+        self.stats.max_concurrent = max(
+            self.stats.max_concurrent, self.stats.concurrent
+        )
+        try:
+            await self._delay()
+            if not self._authorized(request):
+                self.stats.forbidden += 1
+                return web.Response(status=403, text="Forbidden")
+            if self._random.random() < self.config.error_rate:
+                self.stats.errors += 1
+                return web.Response(status=500, text="Internal Server Error")
+            self.stats.pages += 1
+            encoded = body.encode()
+            self.stats.bytes_sent += len(encoded)
+            return web.Response(body=encoded, content_type="text/html", charset="utf-8")
+        finally:
+            self.stats.concurrent -= 1
+
+    async def _handle_modem(self, request: web.Request) -> web.Response:
+        detail = request.query.get("detail") == "1"
+        return await self._page(request, self._detail if detail else self._summary)
+
+    async def _handle_devices(self, request: web.Request) -> web.Response:
+        if self._random.random() < self.config.change_rate:
+            self._devlist_version += 1
+            self._devlist = devlist_page(
+                self.config.clients,
+                self.config.seed,
+                self.config.seed * 100003 + self._devlist_version,
+            )
+        return await self._page(request, self._devlist)
+
+
+async def start_routers(
+    count: int, port: int, config: MockRouterConfig, host: str = "127.0.0.1"
+) -> tuple[list[MockRouter], list[web.AppRunner]]:
+    """Starts the routers on consecutive ports, each with its own seed"""
+
+    routers: list[MockRouter] = []
+    runners: list[web.AppRunner] = []
+    for index in range(count):
+        router = MockRouter(
+            MockRouterConfig(**{**config.__dict__, "seed": config.seed + index})
+        )
+        runner = web.AppRunner(router.application(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port + index).start()
+        routers.append(router)
+        runners.append(runner)
+    return routers, runners
+
+
+def add_config_arguments(arguments: argparse.ArgumentParser) -> None:
+    """Adds the options of MockRouterConfig to the command line"""
+
+    defaults = MockRouterConfig()
+    arguments.add_argument("--routers", type=int, default=1)
+    arguments.add_argument("--port", type=int, default=18080)
+    arguments.add_argument("--username", default=defaults.username)
+    arguments.add_argument("--password", default=defaults.password)
+    arguments.add_argument("--clients", type=int, default=defaults.clients)
+    arguments.add_argument(
+        "--latency", type=float, default=defaults.latency, help="seconds"
+    )
+    arguments.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    arguments.add_argument(
+        "--session-lifetime",
+        type=float,
+        default=defaults.session_lifetime,
+        help="seconds, 0 for sessions that never expire",
+    )
+    arguments.add_argument(
+        "--cookie-max-age", action="store_true", help="send the session lifetime"
+    )
+    arguments.add_argument("--change-rate", type=float, default=defaults.change_rate)
+    arguments.add_argument(
+        "--no-detail", action="store_true", help="emulate firmware without details"
+    )
+
+
+def config_from_arguments(options: argparse.Namespace) -> MockRouterConfig:
+    """Builds the router config from the parsed command line"""
+
+    return MockRouterConfig(
+        username=options.username,
+        password=options.password,
+        clients=options.clients,
+        latency=options.latency,
+        error_rate=options.error_rate,
+        session_lifetime=options.session_lifetime or None,
+        cookie_max_age=options.cookie_max_age,
+        change_rate=options.change_rate,
+        detail_page=not options.no_detail,
+    )
+
+
+async def serve(options: argparse.Namespace) -> None:
+    """Runs the routers until interrupted"""
+
+    _, runners = await start_routers(
+        options.routers, options.port, config_from_arguments(options)
+    )
+    last_port = options.port + options.routers - 1
+    print(f"Serving {options.routers} router(s) on ports {options.port}-{last_port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+
+def main() -> None:
+    """Starts the mock routers from the command line"""
+
+    arguments = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_config_arguments(arguments)
+    try:
+        asyncio.run(serve(arguments.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Benchmarks the parsers of the integration on recorded and generated pages
+
+Usage: python benchmarks/run.py [--backend NAME] [--iterations N] [--json]
+
+Reports throughput, latency percentiles and peak memory of each parser
+function. Home Assistant and the parser engines have to be installed, the
+integration itself is imported without being set up.
+"""
+
+from __future__ import annotations
+
+import argparse
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+import importlib
+import json
+from pathlib import Path
+import statistics
+import sys
+import time
+import tracemalloc
+import types
+from typing import Any
+
+from fixtures import (
+    DEVICE_COUNTS,
+    DURATIONS,
+    DURATIONS_TODAY,
+    GENERATED_DURATIONS,
+    MODEM_STATUS,
+    MODEM_STATUS_DETAIL,
+    devlist_page,
+    generated_durations,
+    load_page,
+)
+
+PACKAGE = "cudy_router"
+PACKAGE_DIR = Path(__file__).resolve().parent.parent
+DEVICE_LIST = "android-0003,00:11:22:33:44:55,laptop-0042"
+
+
+@dataclass
+class Result:
+    """Measurements of a single benchmark."""
+
+    name: str
+    iterations: int
+    ops_per_second: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    peak_kib: float
+
+
+def load_integration(module: str = "parser") -> types.ModuleType:
+    """Imports a module of the integration without running its setup"""
+
+    if PACKAGE not in sys.modules:
+        package = types.ModuleType(PACKAGE)
+        package.__path__ = [str(PACKAGE_DIR)]
+        sys.modules[PACKAGE] = package
+    return importlib.import_module(f"{PACKAGE}.{module}")
+
+
+def measure(
+    name: str, function: Callable[[], Any], iterations: int, warmup: int = 3
+) -> Result:
+    """Times the function, then measures its peak memory in a separate run"""
+
+    for _ in range(warmup):
+        function()
+
+    timings: list[int] = []
+    started = time.perf_counter_ns()
+    for _ in range(iterations):
+        start = time.perf_counter_ns()
+        function()
+        timings.append(time.perf_counter_ns() - start)
+    elapsed = time.perf_counter_ns() - started
+
+    # Tracing slows down allocations, so it's kept out of the timed loop
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    percentiles = (
+        statistics.quantiles(timings, n=100, method="inclusive")
+        if len(timings) > 1
+        else timings * 99
+    )
+    return Result(
+        name=name,
+        iterations=iterations,
+        ops_per_second=iterations / elapsed * 1e9,
+        p50_ms=percentiles[49] / 1e6,
+        p95_ms=percentiles[94] / 1e6,
+        p99_ms=percentiles[98] / 1e6,
+        peak_kib=peak / 1024,
+    )
+
+
+def benchmarks(parser: types.ModuleType) -> list[tuple[str, Callable[[], Any], int]]:
+    """Returns the benchmarks as (name, function, relative cost) tuples"""
+
+    modem_status = load_page(MODEM_STATUS)
+    modem_detail = load_page(MODEM_STATUS_DETAIL)
+
+    def stream_devices(page: str) -> Any:
+        stream = parser.DeviceListStream()
+        stream.feed(page)
+        return stream.close()
+
+    def durations() -> None:
+        for duration, _ in DURATIONS:
+            parser.get_seconds_duration(duration)
+
+    cases: list[tuple[str, Callable[[], Any], int]] = [
+        ("parse_modem_info[status]", lambda: parser.parse_modem_info(modem_status), 1),
+        ("parse_modem_info[detail]", lambda: parser.parse_modem_info(modem_detail), 1),
+        ("parse_tables[detail]", lambda: parser.parse_tables(modem_detail), 1),
+        (f"get_seconds_duration[x{len(DURATIONS)}]", durations, 1),
+    ]
+    for count in DEVICE_COUNTS:
+        page = devlist_page(count)
+        cases.append(
+            (
+                f"parse_devices[{count}]",
+                lambda page=page: parser.parse_devices(page, DEVICE_LIST),
+                max(count // 10, 1),
+            )
+        )
+        cases.append(
+            (
+                f"DeviceListStream[{count}]",
+                lambda page=page: stream_devices(page),
+                max(count // 10, 1),
+            )
+        )
+    return cases
+
+
+def check_durations(parser: types.ModuleType) -> list[str]:
+    """Returns the durations that are not parsed to the expected seconds
+
+    Both the recorded values and the generated ones are checked.
+    """
+
+    cases = [(duration, DURATIONS_TODAY, expected) for duration, expected in DURATIONS]
+    cases += generated_durations(GENERATED_DURATIONS)
+    return [
+        f"{duration!r} on {today}: {seconds!r} instead of {expected}"
+        for duration, today, expected in cases
+        if type(seconds := parser.get_seconds_duration(duration, today)) is not int
+        or seconds != expected
+    ]
+
+
+def main() -> None:
+    """Runs the benchmarks and prints the results"""
+
+    parser = load_integration()
+    backends = load_integration("parser_backends")
+
+    arguments = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arguments.add_argument("--backend", choices=sorted(backends.BACKENDS))
+    arguments.add_argument(
+        "--iterations", type=int, default=200, help="runs of the cheapest benchmarks"
+    )
+    arguments.add_argument("--filter", default="", help="run only matching benchmarks")
+    arguments.add_argument("--json", action="store_true", help="print JSON lines")
+    options = arguments.parse_args()
+
+    if errors := check_durations(parser):
+        sys.exit("Wrong durations:\n" + "\n".join(errors))
+
+    # parser.py binds the backend at import time
+    parser.BACKEND = backends.get_backend(options.backend)
+    if not options.json:
+        print(f"Backend: {parser.BACKEND.name}")
+        print(
+            f"{'benchmark':<30} {'runs':>6} {'ops/s':>10} {'p50 ms':>9}"
+            f" {'p95 ms':>9} {'p99 ms':>9} {'peak KiB':>10}"
+        )
+
+    for name, function, cost in benchmarks(parser):
+        if options.filter not in name:
+            continue
+        # Bigger pages get fewer runs, so a full run takes about the same time
+        iterations = max(options.iterations // cost, 5)
+        result = measure(name, function, iterations)
+        if options.json:
+            print(json.dumps({"backend": parser.BACKEND.name, **asdict(result)}))
+        else:
+            print(
+                f"{result.name:<30} {result.iterations:>6} {result.ops_per_second:>10.1f}"
+                f" {result.p50_ms:>9.3f} {result.p95_ms:>9.3f} {result.p99_ms:>9.3f}"
+                f" {result.peak_kib:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -19,8 +19,25 @@ from homeassistant.data_entry_flow import FlowResult
 from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers import selector
 
+from .history import parse_windows
 from .router import CudyRouter
-from .const import DOMAIN, OPTIONS_DEVICELIST
+from .const import (
+    DEFAULT_DEVICES_SCAN_INTERVAL,
+    DEFAULT_IDLE_TIMEOUT,
+    DEFAULT_PARSE_MODE,
+    DEFAULT_POOL_SIZE,
+    DEFAULT_SCAN_INTERVAL,
+    DEFAULT_STATISTICS_WINDOWS,
+    DOMAIN,
+    OPTIONS_AUTO_DISCOVERY,
+    OPTIONS_DEVICELIST,
+    OPTIONS_DEVICES_SCAN_INTERVAL,
+    OPTIONS_IDLE_TIMEOUT,
+    OPTIONS_PARSE_MODE,
+    OPTIONS_POOL_SIZE,
+    OPTIONS_STATISTICS_WINDOWS,
+    PARSE_MODES,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -39,7 +56,7 @@ async def validate_input(hass: HomeAssistant, data: dict[str, Any]):
 
     router = CudyRouter(hass, data[CONF_HOST], data[CONF_USERNAME], data[CONF_PASSWORD])
 
-    if not await hass.async_add_executor_job(router.authenticate):
+    if not await router.authenticate():
         raise InvalidAuth
 
 
@@ -104,10 +121,29 @@ class CudyRouterOptionsFlowHandler(config_entries.OptionsFlow):
         if user_input is not None:
             logging.debug("user_input: %s", user_input)
             device_list = user_input.get(OPTIONS_DEVICELIST) or ""
-            scan_interval = user_input.get(CONF_SCAN_INTERVAL) or 15
+            auto_discovery = bool(user_input.get(OPTIONS_AUTO_DISCOVERY))
+            idle_timeout = user_input.get(OPTIONS_IDLE_TIMEOUT) or DEFAULT_IDLE_TIMEOUT
+            scan_interval = user_input.get(CONF_SCAN_INTERVAL) or DEFAULT_SCAN_INTERVAL
+            devices_scan_interval = (
+                user_input.get(OPTIONS_DEVICES_SCAN_INTERVAL)
+                or DEFAULT_DEVICES_SCAN_INTERVAL
+            )
+            pool_size = user_input.get(OPTIONS_POOL_SIZE) or DEFAULT_POOL_SIZE
+            parse_mode = user_input.get(OPTIONS_PARSE_MODE) or DEFAULT_PARSE_MODE
+            statistics_windows = user_input.get(OPTIONS_STATISTICS_WINDOWS) or ""
+            try:
+                parse_windows(statistics_windows)
+            except ValueError:
+                errors[OPTIONS_STATISTICS_WINDOWS] = "invalid_statistics_windows"
 
             options[OPTIONS_DEVICELIST] = device_list
+            options[OPTIONS_AUTO_DISCOVERY] = auto_discovery
+            options[OPTIONS_IDLE_TIMEOUT] = idle_timeout
             options[CONF_SCAN_INTERVAL] = scan_interval
+            options[OPTIONS_DEVICES_SCAN_INTERVAL] = devices_scan_interval
+            options[OPTIONS_POOL_SIZE] = pool_size
+            options[OPTIONS_PARSE_MODE] = parse_mode
+            options[OPTIONS_STATISTICS_WINDOWS] = statistics_windows
 
             # Save if there's no errors, else fall through and show the form again
             if not errors:
@@ -121,9 +157,27 @@ class CudyRouterOptionsFlowHandler(config_entries.OptionsFlow):
                         OPTIONS_DEVICELIST,
                         default=options.get(OPTIONS_DEVICELIST) or "",
                     ): str,
+                    vol.Optional(
+                        OPTIONS_AUTO_DISCOVERY,
+                        default=options.get(OPTIONS_AUTO_DISCOVERY) or False,
+                    ): selector.BooleanSelector(),
+                    vol.Optional(
+                        OPTIONS_IDLE_TIMEOUT,
+                        default=options.get(OPTIONS_IDLE_TIMEOUT)
+                        or DEFAULT_IDLE_TIMEOUT,
+                    ): selector.NumberSelector(
+                        selector.NumberSelectorConfig(
+                            mode=selector.NumberSelectorMode.BOX,
+                            unit_of_measurement="minutes",
+                            min=5,
+                            max=60 * 24 * 30,
+                            step=5,
+                        ),
+                    ),
                     vol.Optional(
                         CONF_SCAN_INTERVAL,
-                        default=options.get(CONF_SCAN_INTERVAL) or 15,
+                        default=options.get(CONF_SCAN_INTERVAL)
+                        or DEFAULT_SCAN_INTERVAL,
                     ): selector.NumberSelector(
                         selector.NumberSelectorConfig(
                             mode=selector.NumberSelectorMode.BOX,
@@ -133,6 +187,47 @@ class CudyRouterOptionsFlowHandler(config_entries.OptionsFlow):
                             step=5,
                         ),
                     ),
+                    vol.Optional(
+                        OPTIONS_DEVICES_SCAN_INTERVAL,
+                        default=options.get(OPTIONS_DEVICES_SCAN_INTERVAL)
+                        or DEFAULT_DEVICES_SCAN_INTERVAL,
+                    ): selector.NumberSelector(
+                        selector.NumberSelectorConfig(
+                            mode=selector.NumberSelectorMode.BOX,
+                            unit_of_measurement="seconds",
+                            min=5,
+                            max=60 * 60,
+                            step=5,
+                        ),
+                    ),
+                    vol.Optional(
+                        OPTIONS_POOL_SIZE,
+                        default=options.get(OPTIONS_POOL_SIZE) or DEFAULT_POOL_SIZE,
+                    ): selector.NumberSelector(
+                        selector.NumberSelectorConfig(
+                            mode=selector.NumberSelectorMode.BOX,
+                            unit_of_measurement="requests",
+                            min=1,
+                            max=8,
+                            step=1,
+                        ),
+                    ),
+                    vol.Optional(
+                        OPTIONS_PARSE_MODE,
+                        default=options.get(OPTIONS_PARSE_MODE) or DEFAULT_PARSE_MODE,
+                    ): selector.SelectSelector(
+                        selector.SelectSelectorConfig(
+                            options=PARSE_MODES,
+                            mode=selector.SelectSelectorMode.DROPDOWN,
+                            translation_key=OPTIONS_PARSE_MODE,
+                        ),
+                    ),
+                    vol.Optional(
+                        OPTIONS_STATISTICS_WINDOWS,
+                        default=options.get(
+                            OPTIONS_STATISTICS_WINDOWS, DEFAULT_STATISTICS_WINDOWS
+                        ),
+                    ): str,
                 }
             ),
             errors=errors,
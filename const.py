@@ -4,7 +4,39 @@ DOMAIN = "cudy_router"
 
 MODULE_MODEM = "modem"
 MODULE_DEVICES = "devices"
+# Not fetched, timings and counters of the polls
+MODULE_DIAGNOSTICS = "diagnostics"
+# Not fetched, rolling statistics of the metrics
+MODULE_STATISTICS = "statistics"
+# Not fetched, bytes transferred by the clients
+MODULE_TRAFFIC = "traffic"
 
-SECTION_DETAILED = "detailed"
+# Key of the scheduler shared by the config entries in hass.data[DOMAIN]
+DATA_SCHEDULER = "scheduler"
 
 OPTIONS_DEVICELIST = "device_list"
+OPTIONS_POOL_SIZE = "pool_size"
+OPTIONS_DEVICES_SCAN_INTERVAL = "devices_scan_interval"
+OPTIONS_AUTO_DISCOVERY = "auto_discovery"
+OPTIONS_IDLE_TIMEOUT = "idle_timeout"
+OPTIONS_PARSE_MODE = "parse_mode"
+OPTIONS_STATISTICS_WINDOWS = "statistics_windows"
+
+# Where the pages are parsed: on the event loop, in the executor or in a
+# process pool shared by the routers
+PARSE_MODE_INLINE = "inline"
+PARSE_MODE_EXECUTOR = "executor"
+PARSE_MODE_PROCESS = "process"
+PARSE_MODES = [PARSE_MODE_INLINE, PARSE_MODE_EXECUTOR, PARSE_MODE_PROCESS]
+
+DEFAULT_POOL_SIZE = 2
+DEFAULT_SCAN_INTERVAL = 15
+DEFAULT_DEVICES_SCAN_INTERVAL = 60
+DEFAULT_IDLE_TIMEOUT = 24 * 60
+DEFAULT_PARSE_MODE = PARSE_MODE_INLINE
+# Comma separated minutes
+DEFAULT_STATISTICS_WINDOWS = "5,60"
+
+STORAGE_VERSION = 1
+STORAGE_KEY_AUTH = f"{DOMAIN}.{{entry_id}}.auth"
+STORAGE_KEY_TRAFFIC = f"{DOMAIN}.{{entry_id}}.traffic"
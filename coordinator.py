@@ -1,48 +1,389 @@
 """Coordinator for Cudy Router integration."""
 from datetime import timedelta
 import logging
+import random
+import time
 from typing import Any
 
 import async_timeout
 
 from homeassistant.const import CONF_HOST, CONF_SCAN_INTERVAL
 
-from .router import CudyRouter
+from .router import (
+    MIN_TIME_BETWEEN_UPDATES,
+    PAGE_NAMES,
+    RETRY_INTERVAL,
+    CudyRouter,
+)
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 
-from .const import DOMAIN
+from .const import (
+    DEFAULT_DEVICES_SCAN_INTERVAL,
+    DEFAULT_SCAN_INTERVAL,
+    DEFAULT_STATISTICS_WINDOWS,
+    DOMAIN,
+    MODULE_DEVICES,
+    MODULE_DIAGNOSTICS,
+    MODULE_MODEM,
+    MODULE_STATISTICS,
+    MODULE_TRAFFIC,
+    OPTIONS_AUTO_DISCOVERY,
+    OPTIONS_DEVICELIST,
+    OPTIONS_DEVICES_SCAN_INTERVAL,
+    OPTIONS_STATISTICS_WINDOWS,
+)
+from .history import MetricHistory, history_size, parse_windows
+from .models import (
+    ClientTraffic,
+    DeviceRecord,
+    DevicesSnapshot,
+    DiagnosticsSnapshot,
+    MetricStatistics,
+    Snapshot,
+    StatisticsSnapshot,
+    TrafficSnapshot,
+)
+from .parser import build_device_index, get_tracked_device, normalize_device_id
+from .traffic import TrafficCounters
+from .scheduler import CudyRouterScheduler
 
 _LOGGER = logging.getLogger(__name__)
 
+# Modules due within this time are fetched together with the current refresh
+SCHEDULE_TOLERANCE = 1.0
+BACKOFF_JITTER = 0.2
+# Metrics with rolling statistics, by module
+HISTORY_METRICS = {
+    MODULE_MODEM: ("rssi", "rsrp", "rsrq", "sinr"),
+    MODULE_DEVICES: ("total_down_speed", "total_up_speed"),
+}
+# Heaviest users listed with the traffic totals
+TOP_USERS = 5
+# Speed samples further apart, in device list scan intervals, are not counted
+MAX_TRAFFIC_GAP = 3
+# Traffic counters are saved at most this often, and at shutdown
+TRAFFIC_SAVE_DELAY = 15 * 60
+# Clients not seen for this long are removed from the traffic counters
+TRAFFIC_RETENTION = 30 * 24 * 3600
 
-class CudyRouterDataUpdateCoordinator(DataUpdateCoordinator[dict[str, Any]]):
+
+class CudyRouterDataUpdateCoordinator(DataUpdateCoordinator[dict[str, Snapshot]]):
     """Get the latest data from the router."""
 
     config_entry: ConfigEntry
 
     def __init__(
-        self, hass: HomeAssistant, entry: ConfigEntry, api: CudyRouter
+        self,
+        hass: HomeAssistant,
+        entry: ConfigEntry,
+        api: CudyRouter,
+        scheduler: CudyRouterScheduler,
     ) -> None:
         """Initialize router data."""
         self.hass = hass
         self.config_entry = entry
         self.host: str = entry.data[CONF_HOST]
         self.api = api
-        scan_interval = (entry.options and entry.options.get(CONF_SCAN_INTERVAL)) or 15
+        self.scheduler = scheduler
+        options = entry.options or {}
+        self.module_intervals: dict[str, float] = {
+            MODULE_MODEM: options.get(CONF_SCAN_INTERVAL) or DEFAULT_SCAN_INTERVAL,
+            MODULE_DEVICES: options.get(OPTIONS_DEVICES_SCAN_INTERVAL)
+            or DEFAULT_DEVICES_SCAN_INTERVAL,
+        }
+        self.auto_discovery = bool(options.get(OPTIONS_AUTO_DISCOVERY))
+        # Built once, the entry is reloaded when the options change
+        self.configured_devices = build_device_index(options.get(OPTIONS_DEVICELIST))
+        # Loop time when each device with detailed report was last seen
+        self.device_last_seen: dict[str, float] = {}
+        # Minutes, validated by the options flow; empty turns statistics off
+        self.statistics_windows = parse_windows(
+            options.get(OPTIONS_STATISTICS_WINDOWS, DEFAULT_STATISTICS_WINDOWS)
+        )
+        self.history: dict[str, MetricHistory] = {}
+        self.traffic = TrafficCounters()
+        self._traffic_store: Store[dict[str, Any]] | None = None
+        self._traffic_save_scheduled = False
+        if self.statistics_windows:
+            longest = max(self.statistics_windows) * 60
+            for module, keys in HISTORY_METRICS.items():
+                for key in keys:
+                    self.history[key] = MetricHistory(
+                        history_size(longest, self.module_intervals[module])
+                    )
+        # Loop time when each module is due next; missing modules are due now
+        self._module_due: dict[str, float] = {}
+        self.failure_count = 0
+        self._dispatched_data: dict[str, Snapshot] | None = None
+        self._dispatched_success = False
+        self.last_poll_ms: float | None = None
+        # Slot of the polls on the clock shared by the routers, applied after
+        # every poll, so routers set up together are polled one by one
+        self.slot = scheduler.async_register(entry.entry_id)
         super().__init__(
             hass,
             _LOGGER,
             name=f"{DOMAIN} - {self.host}",
-            update_interval=timedelta(seconds=scan_interval),
+            update_interval=timedelta(seconds=min(self.module_intervals.values())),
+        )
+
+    def _backoff_interval(self) -> timedelta:
+        """Returns the exponentially growing, jittered delay after failures."""
+        base = max(
+            min(self.module_intervals.values()),
+            MIN_TIME_BETWEEN_UPDATES.total_seconds(),
+        )
+        delay = min(
+            base * 2 ** (self.failure_count - 1), RETRY_INTERVAL.total_seconds()
+        )
+        return timedelta(
+            seconds=delay * random.uniform(1 - BACKOFF_JITTER, 1 + BACKOFF_JITTER)
+        )
+
+    def get_device(
+        self, device_id: str, data: dict[str, Snapshot] | None = None
+    ) -> DeviceRecord | None:
+        """Returns the tracked device by its MAC address or hostname."""
+        data = self.data if data is None else data
+        return get_tracked_device(data and data.get(MODULE_DEVICES), device_id)
+
+    def get_device_traffic(
+        self, device_id: str, data: dict[str, Snapshot] | None = None
+    ) -> ClientTraffic | None:
+        """Returns the traffic of the tracked device by MAC address or hostname."""
+        data = self.data if data is None else data
+        traffic = data and data.get(MODULE_TRAFFIC)
+        if not traffic:
+            return None
+        key = normalize_device_id(device_id)
+        if key not in traffic.devices:
+            # Tracked hostnames refer to the MAC address of their device
+            devices = data.get(MODULE_DEVICES)
+            key = devices and devices.hostnames.get(key)
+        return traffic.devices.get(key)
+
+    async def async_restore_traffic(self, store: Store[dict[str, Any]]) -> None:
+        """Restores the traffic counters saved before the last restart."""
+        self._traffic_store = store
+        if stored := await store.async_load():
+            self.traffic = TrafficCounters.from_dict(stored)
+            self.traffic.remove_idle(time.time() - TRAFFIC_RETENTION)
+
+    async def async_save_traffic(self) -> None:
+        """Saves the traffic counters now, e.g. before unloading."""
+        if self._traffic_store:
+            self._traffic_save_scheduled = False
+            await self._traffic_store.async_save(self.traffic.as_dict())
+
+    @callback
+    def _traffic_save_data(self) -> dict[str, Any]:
+        """Returns the traffic counters to be saved."""
+        self._traffic_save_scheduled = False
+        self.traffic.remove_idle(time.time() - TRAFFIC_RETENTION)
+        return self.traffic.as_dict()
+
+    @staticmethod
+    def _value_at(data: Any, path: Any) -> Any:
+        """Returns the value at the given path of the module snapshots.
+
+        The path may also be a function that gets the value out of the data.
+        """
+        if callable(path):
+            return path(data)
+        for key in path:
+            if data is None:
+                return None
+            if isinstance(data, dict):
+                data = data.get(key)
+            else:
+                data = getattr(data, key, None)
+        return data
+
+    @callback
+    def async_update_listeners(self) -> None:
+        """Update only the listeners whose data has changed.
+
+        The context of a listener is the tuple of data paths it depends on, e.g.
+        ((MODULE_MODEM, "rssi"),), see _value_at. Listeners without context, and
+        all listeners when the availability changed, are always updated.
+        """
+        previous, self._dispatched_data = self._dispatched_data, self.data
+        update_all = (
+            previous is None or self._dispatched_success != self.last_update_success
+        )
+        self._dispatched_success = self.last_update_success
+        for update_callback, context in list(self._listeners.values()):
+            if (
+                update_all
+                or not context
+                or any(
+                    self._value_at(previous, path) != self._value_at(self.data, path)
+                    for path in context
+                )
+            ):
+                update_callback()
+
+    def _diagnostics_data(self) -> DiagnosticsSnapshot:
+        """Returns the timings of the last poll and the request counters."""
+        stats = self.api.stats
+        return DiagnosticsSnapshot(
+            poll_duration=round(self.last_poll_ms, 1),
+            fetch_time=round(max(stats.fetch_ms.values(), default=0.0), 1),
+            parse_time=round(sum(stats.parse_ms.values()), 1),
+            queue_wait=round(stats.queue_ms, 1),
+            logins=stats.logins,
+            bytes_downloaded=stats.bytes_downloaded,
+            last_login_ms=stats.login_ms and round(stats.login_ms, 1),
+            queued_polls=self.scheduler.polls.waiting,
+            queued_parses=self.scheduler.parses.waiting,
+            fetch_times={
+                PAGE_NAMES.get(url, url): round(ms, 1)
+                for url, ms in stats.fetch_ms.items()
+            },
+            parse_times={module: round(ms, 1) for module, ms in stats.parse_ms.items()},
+        )
+
+    def _statistics_data(
+        self, data: dict[str, Snapshot], modules: list[str], now: float
+    ) -> StatisticsSnapshot:
+        """Records the metrics of the fetched modules and returns the statistics.
+
+        Statistics of the modules that were not fetched are kept, as their
+        history didn't change.
+        """
+        previous = self.data and self.data.get(MODULE_STATISTICS)
+        metrics: dict[str, dict[int, MetricStatistics]] = dict(
+            previous.metrics if previous else {}
         )
+        for module in modules:
+            snapshot = data.get(module)
+            for key in HISTORY_METRICS.get(module, ()):
+                if (history := self.history.get(key)) is None:
+                    continue
+                if (value := getattr(snapshot, key, None)) is not None:
+                    history.add(now, value)
+                windows = {}
+                for minutes in self.statistics_windows:
+                    if statistics := history.statistics(now - minutes * 60):
+                        windows[minutes] = statistics
+                metrics[key] = windows
+        return StatisticsSnapshot(metrics)
 
-    async def _async_update_data(self) -> dict[str, Any]:
+    def _traffic_data(self, devices: DevicesSnapshot, now: float) -> TrafficSnapshot:
+        """Counts the traffic since the last device list and returns the totals.
+
+        The save is only scheduled when none is pending, as each scheduling
+        would postpone it again.
+        """
+        traffic = self.traffic
+        traffic.add_samples(
+            devices,
+            now,
+            time.time(),
+            MAX_TRAFFIC_GAP * self.module_intervals[MODULE_DEVICES],
+        )
+        if self._traffic_store and not self._traffic_save_scheduled:
+            self._traffic_save_scheduled = True
+            self._traffic_store.async_delay_save(
+                self._traffic_save_data, TRAFFIC_SAVE_DELAY
+            )
+        return TrafficSnapshot(
+            total_downloaded=round(traffic.total_downloaded),
+            total_uploaded=round(traffic.total_uploaded),
+            top_downloaders=traffic.top(traffic.downloaded, TOP_USERS),
+            top_uploaders=traffic.top(traffic.uploaded, TOP_USERS),
+            devices={
+                mac: client
+                for mac in self.device_last_seen.keys() | self.configured_devices
+                if (client := traffic.client(mac))
+            },
+        )
+
+    def _align_to_slot(self, end: float) -> None:
+        """Moves the next polls to the nearest slot after the end of this poll.
+
+        The slot is on the loop clock, so the polls keep their spread however
+        long the setup or a single poll took.
+        """
+        interval = min(self.module_intervals.values())
+        next_due = min(self._module_due.values())
+        delay = (self.slot * interval - next_due) % interval
+        if delay > interval / 2:
+            delay -= interval
+        if next_due + delay < end + SCHEDULE_TOLERANCE:
+            delay += interval
+        for module in self._module_due:
+            self._module_due[module] += delay
+
+    def _due_modules(self, now: float) -> list[str]:
+        """Returns the modules that should be fetched now."""
+        return [
+            module
+            for module in self.module_intervals
+            if self._module_due.get(module, now) <= now + SCHEDULE_TOLERANCE
+        ]
+
+    async def _async_update_data(self) -> dict[str, Snapshot]:
         """Get the latest data from the router."""
-        async with async_timeout.timeout(30):
-            try:
-                return await self.api.get_data(self.hass, self.config_entry.options)
-            except Exception as err:
-                raise UpdateFailed from err
+        queued = self.hass.loop.time()
+        modules = self._due_modules(queued) or [
+            min(self._module_due, key=self._module_due.__getitem__)
+        ]
+        try:
+            # The whole poll is admitted at once, waiting for the polls of other
+            # routers doesn't use up its timeout
+            async with self.scheduler.polls:
+                now = self.hass.loop.time()
+                # While backing off, don't wait for the timeouts of a router that's down
+                if self.failure_count and not await self.api.async_is_reachable():
+                    raise UpdateFailed(f"{self.host} is not reachable")
+                async with async_timeout.timeout(30):
+                    try:
+                        data = await self.api.get_data(
+                            self.configured_devices,
+                            modules,
+                            self.auto_discovery,
+                        )
+                    except Exception as err:
+                        raise UpdateFailed from err
+                    finally:
+                        self.last_poll_ms = (self.hass.loop.time() - now) * 1000
+            self.api.stats.queue_ms += (now - queued) * 1000
+        except (UpdateFailed, TimeoutError) as err:
+            self.failure_count += 1
+            self.update_interval = self._backoff_interval()
+            _LOGGER.debug(
+                "Update of %s failed %s time(s), retrying in %s",
+                self.host,
+                self.failure_count,
+                self.update_interval,
+            )
+            if isinstance(err, UpdateFailed):
+                raise
+            raise UpdateFailed(f"Timeout fetching data from {self.host}") from err
+
+        self.failure_count = 0
+        if devices := data.get(MODULE_DEVICES):
+            for device_id in devices.detailed:
+                self.device_last_seen[device_id] = now
+            data[MODULE_TRAFFIC] = self._traffic_data(devices, now)
+        for module in modules:
+            self._module_due[module] = now + self.module_intervals[module]
+        end = self.hass.loop.time()
+        self._align_to_slot(end)
+        # Wake up when the next module is due instead of on a fixed tick, counted
+        # from the end of this poll
+        self.update_interval = timedelta(
+            seconds=max(min(self._module_due.values()) - end, SCHEDULE_TOLERANCE)
+        )
+        # Modules that were not fetched keep their last values
+        return {
+            **(self.data or {}),
+            **data,
+            MODULE_STATISTICS: self._statistics_data(data, modules, now),
+            MODULE_DIAGNOSTICS: self._diagnostics_data(),
+        }
@@ -0,0 +1,138 @@
+"""Support for Cudy Router device tracker platform."""
+from __future__ import annotations
+
+from typing import Any
+
+from .const import DOMAIN, MODULE_DEVICES
+from .coordinator import CudyRouterDataUpdateCoordinator
+from .models import DeviceRecord, DevicesSnapshot, Snapshot
+from .parser import MAC_ADDRESS_PATTERN
+
+from homeassistant.components.device_tracker import ScannerEntity, SourceType
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import Platform
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+
+
+def get_devices(data: dict[str, Snapshot] | None) -> DevicesSnapshot | None:
+    """Returns the device list of the last refresh"""
+
+    return data and data.get(MODULE_DEVICES)
+
+
+def get_client(data: dict[str, Snapshot] | None, mac: str) -> DeviceRecord | None:
+    """Returns the connected client with the given MAC address"""
+
+    devices = get_devices(data)
+    return devices and devices.client(mac)
+
+
+def tracker_unique_id(entry_id: str, mac: str) -> str:
+    """Returns the unique ID of a client tracker"""
+
+    return f"{entry_id}-tracker-{mac.replace(':', '_')}"
+
+
+async def async_setup_entry(
+    hass: HomeAssistant,
+    config_entry: ConfigEntry,
+    async_add_entities: AddEntitiesCallback,
+) -> None:
+    """Set up trackers for the clients of the Cudy Router."""
+
+    coordinator: CudyRouterDataUpdateCoordinator = hass.data[DOMAIN][
+        config_entry.entry_id
+    ]
+
+    # Clients known from earlier runs, so they can be reported as away
+    prefix = tracker_unique_id(config_entry.entry_id, "")
+    tracked: set[str] = set()
+    for entry in er.async_entries_for_config_entry(
+        er.async_get(hass), config_entry.entry_id
+    ):
+        if entry.domain == Platform.DEVICE_TRACKER and entry.unique_id.startswith(
+            prefix
+        ):
+            mac = entry.unique_id[len(prefix) :].replace("_", ":")
+            if MAC_ADDRESS_PATTERN.match(mac):
+                tracked.add(mac)
+    async_add_entities(
+        CudyRouterClientTracker(coordinator, mac) for mac in sorted(tracked)
+    )
+
+    @callback
+    def async_add_new_clients() -> None:
+        """Add trackers for the clients seen first in the last refresh."""
+        devices = get_devices(coordinator.data)
+        new_clients = devices.clients.keys() - tracked if devices else set()
+        if new_clients:
+            tracked.update(new_clients)
+            async_add_entities(
+                CudyRouterClientTracker(coordinator, mac) for mac in new_clients
+            )
+
+    config_entry.async_on_unload(coordinator.async_add_listener(async_add_new_clients))
+    async_add_new_clients()
+
+
+class CudyRouterClientTracker(
+    CoordinatorEntity[CudyRouterDataUpdateCoordinator], ScannerEntity
+):
+    """Presence of a client, based on the device list of the router."""
+
+    def __init__(self, coordinator: CudyRouterDataUpdateCoordinator, mac: str) -> None:
+        """Initialize the tracker."""
+        super().__init__(coordinator, (self._presence,))
+        self._mac = mac
+        client = get_client(coordinator.data, mac)
+        self._attr_name = (client and client.hostname) or mac
+
+    def _presence(self, data: dict[str, Snapshot] | None) -> tuple[Any, ...]:
+        """Return the values of the client that the state depends on."""
+        client = get_client(data, self._mac)
+        if client is None:
+            return (False, None, None)
+        return (True, client.ip, client.hostname)
+
+    @property
+    def unique_id(self) -> str:
+        """Return the unique ID of the client within the config entry.
+
+        ScannerEntity uses the bare MAC address, which collides between routers
+        seeing the same client.
+        """
+        return tracker_unique_id(self.coordinator.config_entry.entry_id, self._mac)
+
+    @property
+    def _client(self) -> DeviceRecord | None:
+        return get_client(self.coordinator.data, self._mac)
+
+    @property
+    def source_type(self) -> SourceType:
+        """Return the source type of the client."""
+        return SourceType.ROUTER
+
+    @property
+    def is_connected(self) -> bool:
+        """Return true if the client is in the device list of the router."""
+        return self._client is not None
+
+    @property
+    def mac_address(self) -> str:
+        """Return the MAC address of the client."""
+        return self._mac
+
+    @property
+    def ip_address(self) -> str | None:
+        """Return the IP address of the client."""
+        client = self._client
+        return client and client.ip
+
+    @property
+    def hostname(self) -> str | None:
+        """Return the hostname of the client."""
+        client = self._client
+        return client and client.hostname
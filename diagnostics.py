@@ -0,0 +1,111 @@
+"""Diagnostics support for Cudy Router."""
+from __future__ import annotations
+
+from dataclasses import asdict
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+from homeassistant.core import HomeAssistant
+
+from .const import (
+    DOMAIN,
+    MODULE_DEVICES,
+    MODULE_DIAGNOSTICS,
+    MODULE_MODEM,
+    MODULE_STATISTICS,
+    MODULE_TRAFFIC,
+    OPTIONS_DEVICELIST,
+)
+from .coordinator import CudyRouterDataUpdateCoordinator
+
+# The tracked MAC addresses and hostnames are personal data like the clients,
+# and the serving cell locates the router
+TO_REDACT = {
+    CONF_PASSWORD,
+    CONF_USERNAME,
+    OPTIONS_DEVICELIST,
+    "cell",
+    "cell_id",
+    "enb",
+    "sector",
+    "mcc",
+    "mnc",
+}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+
+    coordinator: CudyRouterDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
+    api = coordinator.api
+    data = coordinator.data or {}
+    modem = data.get(MODULE_MODEM)
+    devices = data.get(MODULE_DEVICES)
+    diagnostics = data.get(MODULE_DIAGNOSTICS)
+    statistics = data.get(MODULE_STATISTICS)
+    traffic = data.get(MODULE_TRAFFIC)
+
+    return {
+        "entry": {
+            "data": async_redact_data(entry.data, TO_REDACT),
+            "options": async_redact_data(entry.options, TO_REDACT),
+        },
+        "coordinator": {
+            "last_update_success": coordinator.last_update_success,
+            "failure_count": coordinator.failure_count,
+            "update_interval": coordinator.update_interval
+            and coordinator.update_interval.total_seconds(),
+            "module_intervals": coordinator.module_intervals,
+            "last_poll_ms": coordinator.last_poll_ms,
+            "slot": coordinator.slot,
+            "statistics_windows": coordinator.statistics_windows,
+            "history_sizes": {
+                key: len(history.times) for key, history in coordinator.history.items()
+            },
+        },
+        "scheduler": coordinator.scheduler.as_dict(),
+        "router": {
+            # The session cookie is as good as the password
+            "authenticated": api.auth_cookie is not None,
+            "auth_expires": api.auth_expires and api.auth_expires.isoformat(),
+            "parse_mode": api.parse_mode,
+            "modem_pages": api.modem_pages,
+            "successful_requests": api.successful_requests,
+            "stats": asdict(api.stats),
+        },
+        "page_cache": {
+            "hits": api.page_cache.hits,
+            "misses": api.page_cache.misses,
+            "pages": {
+                url: {
+                    "etag": page.etag,
+                    "last_modified": page.last_modified,
+                    "cached_text": page.text is not None,
+                }
+                for url, page in api.page_cache.pages.items()
+            },
+        },
+        # Clients are left out, their addresses and hostnames are personal data
+        "data": {
+            MODULE_MODEM: modem and async_redact_data(asdict(modem), TO_REDACT),
+            MODULE_DEVICES: devices
+            and {
+                "device_count": devices.device_count,
+                "detailed_count": len(devices.detailed),
+                "total_down_speed": devices.total_down_speed,
+                "total_up_speed": devices.total_up_speed,
+            },
+            MODULE_STATISTICS: statistics and asdict(statistics),
+            MODULE_TRAFFIC: traffic
+            and {
+                "counted_clients": len(coordinator.traffic),
+                "total_downloaded": traffic.total_downloaded,
+                "total_uploaded": traffic.total_uploaded,
+            },
+            MODULE_DIAGNOSTICS: diagnostics and asdict(diagnostics),
+        },
+    }
@@ -0,0 +1,76 @@
+"""Rolling history of the metrics of a Cudy router, kept in memory"""
+
+from __future__ import annotations
+
+from array import array
+import math
+
+from .models import MetricStatistics
+
+# Longest statistics window in minutes
+MAX_WINDOW = 24 * 60
+# Samples kept per metric at most, whatever the windows and scan intervals
+MAX_SAMPLES = 2880
+
+
+def parse_windows(windows_str: str | None) -> tuple[int, ...]:
+    """Parses the comma separated statistics windows given in minutes
+
+    Raises ValueError for anything else than whole minutes up to MAX_WINDOW.
+    """
+
+    windows: set[int] = set()
+    for window in (windows_str or "").split(","):
+        if window := window.strip():
+            minutes = int(window)
+            if not 1 <= minutes <= MAX_WINDOW:
+                raise ValueError(f"Statistics window out of range: {minutes}")
+            windows.add(minutes)
+    return tuple(sorted(windows))
+
+
+def history_size(window: float, interval: float) -> int:
+    """Returns the samples needed to cover the window, polled at the interval"""
+
+    return min(math.ceil(window / interval) + 1, MAX_SAMPLES)
+
+
+class MetricHistory:
+    """Fixed-size ring buffer of the timestamped samples of a metric.
+
+    Adding a sample is O(1), it overwrites the oldest one when the buffer is
+    full. Statistics are only computed when asked for.
+    """
+
+    __slots__ = ("times", "values", "_next")
+
+    def __init__(self, size: int) -> None:
+        """Initialize."""
+        # Empty slots are older than any window
+        self.times = array("d", [-math.inf]) * size
+        self.values = array("d", [0.0]) * size
+        self._next = 0
+
+    def add(self, time: float, value: float) -> None:
+        """Stores a sample taken at the given loop time"""
+
+        self.times[self._next] = time
+        self.values[self._next] = value
+        self._next = (self._next + 1) % len(self.times)
+
+    def statistics(self, since: float) -> MetricStatistics | None:
+        """Returns the statistics of the samples taken since the given time"""
+
+        values = sorted(
+            value for time, value in zip(self.times, self.values) if time >= since
+        )
+        if not values:
+            return None
+        return MetricStatistics(
+            minimum=values[0],
+            maximum=values[-1],
+            mean=round(sum(values) / len(values), 2),
+            # Nearest-rank percentile
+            p95=values[math.ceil(len(values) * 0.95) - 1],
+            samples=len(values),
+        )
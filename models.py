@@ -0,0 +1,299 @@
+"""Snapshots of the data parsed from a Cudy router and of its polls"""
+
+from __future__ import annotations
+
+from array import array
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+import math
+from typing import Any, ClassVar
+
+# Stands for a missing speed in the float columns of the device table
+MISSING_SPEED = math.nan
+
+
+class Snapshot:
+    """Base of the module snapshots, the sensors read their fields by key.
+
+    ATTRIBUTES maps the keys of the sensors with state attributes to the
+    names of the attributes and the fields they are read from.
+    """
+
+    __slots__ = ()
+
+    ATTRIBUTES: ClassVar[dict[str, dict[str, str]]] = {}
+
+    def attributes(self, key: str) -> dict[str, Any] | None:
+        """Returns the state attributes of the sensor with the given key"""
+
+        names = self.ATTRIBUTES.get(key)
+        if not names:
+            return None
+        return {name: getattr(self, attr) for name, attr in names.items()}
+
+
+@dataclass(slots=True)
+class ModemSnapshot(Snapshot):
+    """Modem state from the modem status pages."""
+
+    ATTRIBUTES: ClassVar[dict[str, dict[str, str]]] = {
+        "network": {"mcc": "mcc", "mnc": "mnc"},
+        "band": {
+            "pcc": "pcc",
+            "scc1": "scc1",
+            "scc2": "scc2",
+            "scc3": "scc3",
+            "scc4": "scc4",
+        },
+        "cell": {"id": "cell_id", "enb": "enb", "sector": "sector", "pcid": "pcid"},
+    }
+
+    network: str
+    sim: str
+    signal: int | str
+    connected_time: int | None = None
+    rssi: int | None = None
+    rsrp: int | None = None
+    rsrq: int | None = None
+    sinr: int | None = None
+    mcc: str | None = None
+    mnc: str | None = None
+    band: str | None = None
+    pcc: str | None = None
+    scc1: str | None = None
+    scc2: str | None = None
+    scc3: str | None = None
+    scc4: str | None = None
+    cell: str | None = None
+    cell_id: int | None = None
+    enb: int | None = None
+    sector: int | None = None
+    pcid: int | None = None
+
+
+@dataclass(slots=True)
+class DeviceRecord:
+    """A client in the device list of the router, speeds in Mbit/s."""
+
+    hostname: str | None
+    ip: str | None
+    mac: str | None
+    up_speed: float | None
+    down_speed: float | None
+
+
+class DeviceTable:
+    """Device list stored by columns, one row per client.
+
+    Speeds are kept in float arrays, with NaN for missing ones, instead of
+    a dictionary per client. Records are only built for the looked up rows.
+    """
+
+    __slots__ = ("hostnames", "ips", "macs", "up_speeds", "down_speeds")
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self.hostnames: list[str | None] = []
+        self.ips: list[str | None] = []
+        self.macs: list[str | None] = []
+        self.up_speeds = array("d")
+        self.down_speeds = array("d")
+
+    def __len__(self) -> int:
+        return len(self.macs)
+
+    def __iter__(self) -> Iterator[DeviceRecord]:
+        return map(self.row, range(len(self)))
+
+    def append(
+        self,
+        hostname: str | None,
+        ip: str | None,
+        mac: str | None,
+        up_speed: float | None,
+        down_speed: float | None,
+    ) -> None:
+        """Adds a client as the last row"""
+
+        self.hostnames.append(hostname)
+        self.ips.append(ip)
+        self.macs.append(mac)
+        self.up_speeds.append(MISSING_SPEED if up_speed is None else up_speed)
+        self.down_speeds.append(MISSING_SPEED if down_speed is None else down_speed)
+
+    def row(self, index: int) -> DeviceRecord:
+        """Returns the client in the given row"""
+
+        up_speed = self.up_speeds[index]
+        down_speed = self.down_speeds[index]
+        return DeviceRecord(
+            self.hostnames[index],
+            self.ips[index],
+            self.macs[index],
+            None if math.isnan(up_speed) else up_speed,
+            None if math.isnan(down_speed) else down_speed,
+        )
+
+    @staticmethod
+    def top_row(speeds: array) -> int | None:
+        """Returns the first row with the highest speed in the column"""
+
+        top = None
+        top_speed = -math.inf
+        for index, speed in enumerate(speeds):
+            if speed > top_speed:
+                top, top_speed = index, speed
+        return top
+
+    @staticmethod
+    def total(speeds: array) -> float:
+        """Returns the sum of the known speeds in the column"""
+
+        return sum(speed for speed in speeds if not math.isnan(speed))
+
+
+@dataclass(slots=True)
+class DevicesSnapshot(Snapshot):
+    """Connected devices from the device list page.
+
+    The clients, detailed and hostnames mappings refer to rows of the table
+    by normalized MAC address or hostname, see parser.normalize_device_id.
+    """
+
+    device_count: int
+    total_down_speed: float = 0.0
+    total_up_speed: float = 0.0
+    top_downloader_speed: float | None = None
+    top_downloader_mac: str | None = None
+    top_downloader_hostname: str | None = None
+    top_uploader_speed: float | None = None
+    top_uploader_mac: str | None = None
+    top_uploader_hostname: str | None = None
+    table: DeviceTable = field(default_factory=DeviceTable)
+    # Row of every client with a MAC address
+    clients: dict[str, int] = field(default_factory=dict)
+    # Row of every device with detailed report, by MAC address or hostname
+    detailed: dict[str, int] = field(default_factory=dict)
+    # Tracked hostnames and the keys of their devices in detailed
+    hostnames: dict[str, str] = field(default_factory=dict)
+
+    def client(self, mac: str) -> DeviceRecord | None:
+        """Returns the client with the given normalized MAC address"""
+
+        row = self.clients.get(mac)
+        return None if row is None else self.table.row(row)
+
+    def detailed_device(self, key: str) -> DeviceRecord | None:
+        """Returns the tracked device by normalized MAC address or hostname"""
+
+        row = self.detailed.get(key)
+        if row is None:
+            row = self.detailed.get(self.hostnames.get(key))
+        return None if row is None else self.table.row(row)
+
+
+@dataclass(slots=True)
+class MetricStatistics:
+    """Statistics of the samples of a metric within a window."""
+
+    minimum: float
+    maximum: float
+    mean: float
+    p95: float
+    samples: int
+
+
+@dataclass(slots=True)
+class StatisticsSnapshot(Snapshot):
+    """Rolling statistics of the metrics, by sensor key and window in minutes."""
+
+    metrics: dict[str, dict[int, MetricStatistics]] = field(default_factory=dict)
+
+    def attributes(self, key: str) -> dict[str, Any] | None:
+        """Returns the statistics of the metric as state attributes"""
+
+        attributes: dict[str, Any] = {}
+        for minutes, statistics in (self.metrics.get(key) or {}).items():
+            attributes[f"min_{minutes}m"] = statistics.minimum
+            attributes[f"max_{minutes}m"] = statistics.maximum
+            attributes[f"mean_{minutes}m"] = statistics.mean
+            attributes[f"p95_{minutes}m"] = statistics.p95
+        return attributes or None
+
+    @staticmethod
+    def attribute_names(windows: Iterable[int]) -> frozenset[str]:
+        """Returns the names of the state attributes for the given windows"""
+
+        return frozenset(
+            f"{name}_{minutes}m"
+            for minutes in windows
+            for name in ("min", "max", "mean", "p95")
+        )
+
+
+@dataclass(slots=True)
+class ClientTraffic:
+    """Bytes transferred by a client since it is counted."""
+
+    downloaded: int
+    uploaded: int
+
+
+@dataclass(slots=True)
+class TrafficSnapshot(Snapshot):
+    """Bytes transferred by the clients since they are counted.
+
+    The top lists hold the MAC address, hostname and bytes of the heaviest
+    users, largest first.
+    """
+
+    total_downloaded: int
+    total_uploaded: int
+    top_downloaders: list[dict[str, Any]] = field(default_factory=list)
+    top_uploaders: list[dict[str, Any]] = field(default_factory=list)
+    # Traffic of the devices with detailed report, by normalized MAC address
+    devices: dict[str, ClientTraffic] = field(default_factory=dict)
+
+    def attributes(self, key: str) -> dict[str, Any] | None:
+        """Returns the heaviest users as state attributes of the totals"""
+
+        if key == "total_downloaded":
+            return {"top_downloaders": self.top_downloaders}
+        if key == "total_uploaded":
+            return {"top_uploaders": self.top_uploaders}
+        return None
+
+
+@dataclass(slots=True)
+class DiagnosticsSnapshot(Snapshot):
+    """Timings of the last poll and the request counters, in milliseconds."""
+
+    ATTRIBUTES: ClassVar[dict[str, dict[str, str]]] = {
+        "logins": {"last_login_ms": "last_login_ms"},
+        "queue_wait": {
+            "queued_polls": "queued_polls",
+            "queued_parses": "queued_parses",
+        },
+    }
+
+    poll_duration: float
+    fetch_time: float
+    parse_time: float
+    queue_wait: float
+    logins: int
+    bytes_downloaded: int
+    last_login_ms: float | None = None
+    queued_polls: int = 0
+    queued_parses: int = 0
+    # By page name and by module
+    fetch_times: dict[str, float] = field(default_factory=dict)
+    parse_times: dict[str, float] = field(default_factory=dict)
+
+    def attributes(self, key: str) -> dict[str, Any] | None:
+        """Returns the state attributes of the sensor with the given key"""
+
+        if key == "fetch_time":
+            return dict(self.fetch_times)
+        if key == "parse_time":
+            return dict(self.parse_times)
+        return Snapshot.attributes(self, key)
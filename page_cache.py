@@ -0,0 +1,107 @@
+"""Cache of the pages retrieved from a Cudy router and their parsed results"""
+
+from __future__ import annotations
+
+from collections.abc import Callable
+from dataclasses import dataclass
+import hashlib
+from typing import Any
+
+
+def page_hash(body: bytes = b"") -> Any:
+    """Returns a hash object for page bodies, that can be updated with chunks"""
+
+    return hashlib.blake2b(body, digest_size=16)
+
+
+@dataclass
+class CachedPage:
+    """Last retrieved version of a page."""
+
+    digest: bytes
+    text: str | None = None
+    etag: str | None = None
+    last_modified: str | None = None
+
+
+class PageCache:
+    """Keeps the last version of each page and the results parsed out of them.
+
+    A result is reused as long as every page it was parsed from has the same
+    body hash, or the router answered a conditional request with 304.
+    """
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self.pages: dict[str, CachedPage] = {}
+        self._results: dict[tuple[str, ...], tuple[tuple[bytes, ...], Any]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def request_headers(self, url: str) -> dict[str, str]:
+        """Returns the conditional request headers of the page"""
+
+        headers: dict[str, str] = {}
+        if page := self.pages.get(url):
+            if page.etag:
+                headers["If-None-Match"] = page.etag
+            if page.last_modified:
+                headers["If-Modified-Since"] = page.last_modified
+        return headers
+
+    def update(
+        self,
+        url: str,
+        digest: bytes,
+        decode: Callable[[], str] | None,
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ) -> str | None:
+        """Stores the retrieved page and returns its text
+
+        The body is only decoded if its hash differs from the cached one.
+        Without a decode function (streamed pages) only the hash is kept.
+        """
+
+        page = self.pages.get(url)
+        text = None
+        if page and page.digest == digest and page.text is not None:
+            text = page.text
+        elif decode:
+            text = decode()
+        self.pages[url] = CachedPage(digest, text, etag, last_modified)
+        return text
+
+    def not_modified(self, url: str) -> str | None:
+        """Returns the cached text of a page the router answered with 304"""
+
+        page = self.pages.get(url)
+        return page and page.text
+
+    def invalidate(self, url: str) -> None:
+        """Forgets the page, e.g. after a failed request"""
+
+        self.pages.pop(url, None)
+
+    def _digests(self, urls: tuple[str, ...]) -> tuple[bytes, ...] | None:
+        digests = tuple(self.pages[url].digest for url in urls if url in self.pages)
+        return digests if len(digests) == len(urls) else None
+
+    def get_result(self, urls: tuple[str, ...]) -> Any | None:
+        """Returns the result parsed from the given pages if they didn't change"""
+
+        digests = self._digests(urls)
+        cached = self._results.get(urls)
+        if digests is not None and cached and cached[0] == digests:
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        return None
+
+    def set_result(self, urls: tuple[str, ...], result: Any) -> None:
+        """Stores the result parsed from the current version of the pages"""
+
+        if (digests := self._digests(urls)) is not None:
+            self._results[urls] = (digests, result)
+        else:
+            self._results.pop(urls, None)
@@ -1,14 +1,45 @@
 """Helper methods to parse HTML returned by Cudy routers"""
 
+import calendar
+from datetime import date
 import re
+import time
 from typing import Any
-from bs4 import BeautifulSoup
-from dateutil.relativedelta import relativedelta
-from datetime import datetime
 
 from homeassistant.const import STATE_UNAVAILABLE
 
-from .const import SECTION_DETAILED
+from .models import DeviceRecord, DevicesSnapshot, DeviceTable, ModemSnapshot
+from .parser_backends import BACKEND, DeviceCellTokenizer
+
+# Fields of the modem status pages that are used by parse_modem_info
+MODEM_FIELDS = frozenset(
+    {
+        "Network Type",
+        "MCC",
+        "MNC",
+        "Connected Time",
+        "RSSI",
+        "RSRP",
+        "RSRQ",
+        "SINR",
+        "PCC",
+        "Band",
+        "DL Bandwidth",
+        "SCC",
+        "SCC2",
+        "SCC3",
+        "SCC4",
+        "Cell ID",
+        "PCID",
+    }
+)
+SIM_ICON_FIELD = "SIM icon"
+MAC_ADDRESS_PATTERN = re.compile(r"^[0-9a-f]{2}([:-][0-9a-f]{2}){5}$")
+# Parts of durations like "1 Year 2 Months 3 Weeks 4 Days 05:06:07"
+DURATION_PATTERN = re.compile(
+    r"(\d+)\s*(year|month|week|day)|(\d+):(\d+):(\d+)", re.IGNORECASE
+)
+DURATION_UNIT_SECONDS = {"week": 7 * 24 * 3600, "day": 24 * 3600}
 
 
 def add_unique(data: dict[str, Any], key: str, value: Any):
@@ -25,21 +56,18 @@ def add_unique(data: dict[str, Any], key: str, value: Any):
 def parse_tables(input_html: str) -> dict[str, Any]:
     """Parses an HTML table extracting key-value pairs"""
 
+    return parse_table_rows(BACKEND.table_rows(input_html))
+
+
+def parse_table_rows(rows: list[list[str]]) -> dict[str, Any]:
+    """Builds key-value pairs from the extracted table rows"""
+
     data: dict[str, str] = {}
-    soup = BeautifulSoup(input_html, "html.parser")
-    tables = soup.find_all("table")
-    for table in tables:
-        for row in table.find_all("tr"):
-            cols = row.css.select("td p.visible-xs")
-            row_data: list[str] = []
-            for col in cols:
-                stripped_text = col.text.strip()
-                if stripped_text:
-                    row_data.append(stripped_text)
-            if len(row_data) > 1:
-                add_unique(data, row_data[0], re.sub("[\n]", "", row_data[1]))
-            elif len(row_data) == 1:
-                add_unique(data, row_data[0], "")
+    for row_data in rows:
+        if len(row_data) > 1:
+            add_unique(data, row_data[0], re.sub("[\n]", "", row_data[1]))
+        elif len(row_data) == 1:
+            add_unique(data, row_data[0], "")
 
     return data
 
@@ -60,51 +88,86 @@ def parse_speed(input_string: str) -> float:
     return 0
 
 
-def get_all_devices(input_html: str) -> dict[str, Any]:
-    """Parses an HTML table extracting key-value pairs"""
-    devices = []
-    soup = BeautifulSoup(input_html, "html.parser")
-    for br_element in soup.find_all("br"):
-        br_element.replace_with("\n" + br_element.text)
-    tables = soup.find_all("table")
-    for table in tables:
-        for row in table.find_all("tr"):
-            ip, mac, up_speed, down_speed, hostname = [None, None, None, None, None]
-            cols = row.css.select("td div")
-            for col in cols:
-                div_id = col.attrs.get("id")
-                content_element = col.css.select_one("p.visible-xs")
-                if not div_id or not content_element:
-                    continue
-                content = content_element.text.strip()
-                if "\n" in content:
-                    if div_id.endswith("ipmac"):
-                        ip, mac = [x.strip() for x in content.split("\n")]
-                    if div_id.endswith("speed"):
-                        up_speed, down_speed = [x.strip() for x in content.split("\n")]
-                    if div_id.endswith("hostname"):
-                        hostname = content.split("\n")[0].strip()
-            if mac or ip:
-                devices.append(
-                    {
-                        "hostname": hostname,
-                        "ip": ip,
-                        "mac": mac,
-                        "up_speed": parse_speed(up_speed),
-                        "down_speed": parse_speed(down_speed),
-                    }
-                )
+def get_all_devices(input_html: str) -> DeviceTable:
+    """Parses the device list into a table"""
+    devices = DeviceTable()
+    for cells in BACKEND.device_cells(input_html):
+        device = parse_device_cells(cells)
+        if device:
+            devices.append(*device)
 
     return devices
 
 
+def parse_device_cells(
+    cells: list[tuple[str, str]]
+) -> tuple[str | None, str | None, str | None, float | None, float | None] | None:
+    """Parses the cells of a single device list row
+
+    Returns the hostname, IP, MAC, upload and download speed of the device,
+    in the order of the DeviceTable.append arguments.
+    """
+
+    ip, mac, up_speed, down_speed, hostname = [None, None, None, None, None]
+    for div_id, raw_content in cells:
+        content = raw_content.strip()
+        if "\n" in content:
+            if div_id.endswith("ipmac"):
+                ip, mac = [x.strip() for x in content.split("\n")]
+            if div_id.endswith("speed"):
+                up_speed, down_speed = [x.strip() for x in content.split("\n")]
+            if div_id.endswith("hostname"):
+                hostname = content.split("\n")[0].strip()
+    if mac or ip:
+        return hostname, ip, mac, parse_speed(up_speed), parse_speed(down_speed)
+    return None
+
+
+class DeviceListStream:
+    """Parses the devices page incrementally, while it is being downloaded"""
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self.devices = DeviceTable()
+        # Seconds spent parsing, without waiting for the chunks
+        self.parse_time = 0.0
+        self._tokenizer = DeviceCellTokenizer(self._add_row)
+
+    def _add_row(self, cells: list[tuple[str, str]]) -> None:
+        device = parse_device_cells(cells)
+        if device:
+            self.devices.append(*device)
+
+    def feed(self, chunk: str) -> None:
+        """Parses the next chunk of the page"""
+        started = time.perf_counter()
+        self._tokenizer.feed(chunk)
+        self.parse_time += time.perf_counter() - started
+
+    def reset(self) -> None:
+        """Drops everything parsed so far"""
+        self._tokenizer.reset()
+        self.devices = DeviceTable()
+        self.parse_time = 0.0
+
+    def close(self) -> DeviceTable:
+        """Finishes parsing and returns the devices"""
+        started = time.perf_counter()
+        self._tokenizer.close()
+        self.parse_time += time.perf_counter() - started
+        return self.devices
+
+
 def get_sim_value(input_html: str) -> str:
     """Gets the SIM slot value out of the displayed icon"""
 
-    soup = BeautifulSoup(input_html, "html.parser")
-    sim_icon = soup.css.select_one("i.icon[class*='sim']")
-    if sim_icon:
-        classnames = sim_icon.attrs["class"]
+    return get_sim_slot(BACKEND.sim_icon_classes(input_html))
+
+
+def get_sim_slot(classnames: list[str] | None) -> str:
+    """Gets the SIM slot value out of the class names of the icon"""
+
+    if classnames:
         classname = next(
             iter([match for match in classnames if "sim" in match]),
             "",
@@ -160,119 +223,183 @@ def get_band(raw_band_info: str):
     return None
 
 
-def get_seconds_duration(raw_duration: str) -> int:
-    """Parses string duration and returns it as seconds"""
+def get_seconds_duration(raw_duration: str, today: date | None = None) -> int:
+    """Parses string duration and returns it as seconds
+
+    Years and months are counted back from today, considering their lengths.
+    """
 
     if not raw_duration:
         return None
-    duration_parts = raw_duration.lower().split()
-    duration = relativedelta()
-
-    for i, part in enumerate(duration_parts):
-        if part.count(":") == 2:
-            hours, minutes, seconds = part.split(":")
-            duration += relativedelta(
-                hours=as_int(hours), minutes=as_int(minutes), seconds=as_int(seconds)
-            )
-        elif i == 0:
+    seconds = 0
+    months = 0
+    for match in DURATION_PATTERN.finditer(raw_duration):
+        count, unit, hours, minutes, secs = match.groups()
+        if unit is None:
+            seconds += int(hours) * 3600 + int(minutes) * 60 + int(secs)
             continue
-        elif part.startswith("year"):
-            duration += relativedelta(years=as_int(duration_parts[i - 1]))
-        elif part.startswith("month"):
-            duration += relativedelta(months=as_int(duration_parts[i - 1]))
-        elif part.startswith("week"):
-            duration += relativedelta(weeks=as_int(duration_parts[i - 1]))
-        elif part.startswith("day"):
-            duration += relativedelta(days=as_int(duration_parts[i - 1]))
+        unit = unit.lower()
+        if unit == "year":
+            months += int(count) * 12
+        elif unit == "month":
+            months += int(count)
+        else:
+            seconds += int(count) * DURATION_UNIT_SECONDS[unit]
+
+    if months:
+        seconds += get_months_back_days(months, today or date.today()) * 24 * 3600
+    return seconds
+
+
+def get_months_back_days(months: int, today: date) -> int:
+    """Returns the number of days since the same day the given months ago
+
+    The day is clamped to the length of that month, e.g. 1 month before
+    March 31 is February 28 or 29.
+    """
+
+    year, month = divmod(today.year * 12 + today.month - 1 - months, 12)
+    month += 1
+    day = min(today.day, calendar.monthrange(year, month)[1])
+    return (today - date(year, month, day)).days
+
 
-    # Get absolute duration from relative duration (considering different month lengths)
-    return (datetime.now() - (datetime.now() - duration)).total_seconds()
+def normalize_device_id(device_id: str | None) -> str:
+    """Normalizes a MAC address or hostname for comparison"""
 
+    normalized = (device_id or "").strip().lower()
+    if MAC_ADDRESS_PATTERN.match(normalized):
+        return normalized.replace("-", ":")
+    return normalized
 
-def parse_devices(input_html: str, device_list_str: str) -> dict[str, Any]:
+
+def build_device_index(device_list_str: str | None) -> frozenset[str]:
+    """Builds the set of normalized MAC addresses and hostnames to track"""
+
+    return frozenset(
+        filter(None, map(normalize_device_id, (device_list_str or "").split(",")))
+    )
+
+
+def get_tracked_device(
+    devices_data: DevicesSnapshot | None, device_id: str
+) -> DeviceRecord | None:
+    """Looks up a tracked device by its MAC address or hostname"""
+
+    if not devices_data:
+        return None
+    return devices_data.detailed_device(normalize_device_id(device_id))
+
+
+def parse_devices(input_html: str, device_list_str: str) -> DevicesSnapshot:
     """Parses devices page"""
 
-    devices = get_all_devices(input_html)
-    data = {"device_count": {"value": len(devices)}}
+    return parse_device_page(input_html, build_device_index(device_list_str))
+
+
+def parse_device_page(
+    input_html: str, device_index: frozenset[str], detail_all: bool = False
+) -> DevicesSnapshot:
+    """Parses devices page with the given device index, see parse_device_list"""
+
+    return parse_device_list(get_all_devices(input_html), device_index, detail_all)
+
+
+def parse_device_list(
+    devices: DeviceTable, device_index: frozenset[str], detail_all: bool = False
+) -> DevicesSnapshot:
+    """Summarizes the parsed devices
+
+    Devices in the index get a detailed report, or every device with
+    detail_all. Hostnames in the index refer to their device either way.
+    """
+
+    data = DevicesSnapshot(len(devices), table=devices)
     if devices:
-        top_download_device = max(devices, key=lambda item: item.get("down_speed"))
-        data["top_downloader_speed"] = {"value": top_download_device.get("down_speed")}
-        data["top_downloader_mac"] = {"value": top_download_device.get("mac")}
-        data["top_downloader_hostname"] = {"value": top_download_device.get("hostname")}
-        top_upload_device = max(devices, key=lambda item: item.get("up_speed"))
-        data["top_uploader_speed"] = {"value": top_upload_device.get("up_speed")}
-        data["top_uploader_mac"] = {"value": top_upload_device.get("mac")}
-        data["top_uploader_hostname"] = {"value": top_upload_device.get("hostname")}
-
-        data[SECTION_DETAILED] = {}
-        device_list = [x.strip() for x in (device_list_str or "").split(",")]
-        for device in devices:
-            if device.get("mac") in device_list:
-                data[SECTION_DETAILED][device.get("mac")] = device
-            if device.get("hostname") in device_list:
-                data[SECTION_DETAILED][device.get("hostname")] = device
-
-        data["total_down_speed"] = {
-            "value": sum(device.get("down_speed") for device in devices) or 0.0
-        }
-        data["total_up_speed"] = {
-            "value": sum(device.get("up_speed") for device in devices) or 0.0
-        }
+        top = devices.top_row(devices.down_speeds)
+        if top is not None:
+            data.top_downloader_speed = devices.down_speeds[top]
+            data.top_downloader_mac = devices.macs[top]
+            data.top_downloader_hostname = devices.hostnames[top]
+        top = devices.top_row(devices.up_speeds)
+        if top is not None:
+            data.top_uploader_speed = devices.up_speeds[top]
+            data.top_uploader_mac = devices.macs[top]
+            data.top_uploader_hostname = devices.hostnames[top]
+
+        # Tracked devices are stored once by MAC, hostnames only refer to them
+        for row, (raw_mac, raw_hostname) in enumerate(
+            zip(devices.macs, devices.hostnames)
+        ):
+            mac = normalize_device_id(raw_mac)
+            hostname = normalize_device_id(raw_hostname)
+            key = mac or hostname
+            if mac:
+                data.clients[mac] = row
+            if detail_all or mac in device_index:
+                data.detailed[key] = row
+            if hostname in device_index:
+                data.detailed[key] = row
+                data.hostnames[hostname] = key
+
+        data.total_down_speed = devices.total(devices.down_speeds) or 0.0
+        data.total_up_speed = devices.total(devices.up_speeds) or 0.0
     return data
 
 
-def parse_modem_info(input_html: str) -> dict[str, Any]:
+def parse_modem_info(input_html: str) -> ModemSnapshot:
     """Parses modem info page"""
 
-    raw_data = parse_tables(input_html)
+    return parse_modem_page(input_html)[0]
+
+
+def parse_modem_page(input_html: str) -> tuple[ModemSnapshot, frozenset[str]]:
+    """Parses modem info page, also returning the used fields found on it"""
+
+    rows, sim_icon_classes = BACKEND.modem_page(input_html)
+    raw_data = parse_table_rows(rows)
+    fields = MODEM_FIELDS.intersection(raw_data)
+    if sim_icon_classes:
+        fields = fields | {SIM_ICON_FIELD}
+    return build_modem_info(raw_data, sim_icon_classes), fields
+
+
+def build_modem_info(
+    raw_data: dict[str, Any], sim_icon_classes: list[str] | None
+) -> ModemSnapshot:
+    """Builds the modem info out of the raw page values"""
+
     cellid = hex_as_int(raw_data.get("Cell ID"))
     pcc = raw_data.get("PCC") or (
         f"BAND {raw_data.get('Band')} / {raw_data.get('DL Bandwidth')}"
         if (raw_data.get("Band") and raw_data.get("DL Bandwidth"))
         else None
     )
-    scc1 = raw_data.get("SCC")
-    scc2 = raw_data.get("SCC2")
-    scc3 = raw_data.get("SCC3")
-    scc4 = raw_data.get("SCC4")
-    data: dict[str, dict[str, Any]] = {
-        "network": {
-            "value": (raw_data.get("Network Type") or "").replace(" ...", ""),
-            "attributes": {"mcc": raw_data.get("MCC"), "mnc": raw_data.get("MNC")},
-        },
-        "connected_time": {
-            "value": get_seconds_duration(raw_data.get("Connected Time"))
-        },
-        "signal": {"value": get_signal_strength(as_int(raw_data.get("RSSI")))},
-        "rssi": {"value": as_int(raw_data.get("RSSI"))},
-        "rsrp": {"value": as_int(raw_data.get("RSRP"))},
-        "rsrq": {"value": as_int(raw_data.get("RSRQ"))},
-        "sinr": {"value": as_int(raw_data.get("SINR"))},
-        "sim": {"value": get_sim_value(input_html)},
-        "band": {
-            "value": "+".join(
-                filter(
-                    None,
-                    (get_band(pcc), get_band(scc1), get_band(scc2), get_band(scc3)),
-                )
-                or None
-            ),
-            "attributes": {
-                "pcc": get_band(pcc),
-                "scc1": get_band(scc1),
-                "scc2": get_band(scc2),
-                "scc3": get_band(scc3),
-                "scc4": get_band(scc4),
-            },
-        },
-        "cell": {
-            "value": raw_data.get("Cell ID"),
-            "attributes": {
-                "id": cellid,
-                "enb": cellid // 256 if cellid else None,
-                "sector": cellid % 256 if cellid else None,
-                "pcid": as_int(raw_data.get("PCID")),
-            },
-        },
-    }
-    return data
+    pcc_band = get_band(pcc)
+    scc1_band = get_band(raw_data.get("SCC"))
+    scc2_band = get_band(raw_data.get("SCC2"))
+    scc3_band = get_band(raw_data.get("SCC3"))
+    rssi = as_int(raw_data.get("RSSI"))
+    return ModemSnapshot(
+        network=(raw_data.get("Network Type") or "").replace(" ...", ""),
+        mcc=raw_data.get("MCC"),
+        mnc=raw_data.get("MNC"),
+        connected_time=get_seconds_duration(raw_data.get("Connected Time")),
+        signal=get_signal_strength(rssi),
+        rssi=rssi,
+        rsrp=as_int(raw_data.get("RSRP")),
+        rsrq=as_int(raw_data.get("RSRQ")),
+        sinr=as_int(raw_data.get("SINR")),
+        sim=get_sim_slot(sim_icon_classes),
+        band="+".join(filter(None, (pcc_band, scc1_band, scc2_band, scc3_band))),
+        pcc=pcc_band,
+        scc1=scc1_band,
+        scc2=scc2_band,
+        scc3=scc3_band,
+        scc4=get_band(raw_data.get("SCC4")),
+        cell=raw_data.get("Cell ID"),
+        cell_id=cellid,
+        enb=cellid // 256 if cellid else None,
+        sector=cellid % 256 if cellid else None,
+        pcid=as_int(raw_data.get("PCID")),
+    )
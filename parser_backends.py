@@ -0,0 +1,355 @@
+"""HTML engines used to extract the raw values from Cudy router pages
+
+Every backend returns the same plain lists, so the parsers in parser.py don't
+depend on the engine. The fastest installed engine is used: selectolax, then
+lxml (both C-backed), with BeautifulSoup's html.parser as fallback.
+"""
+
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from collections.abc import Callable
+from html.parser import HTMLParser
+import logging
+from typing import Any
+
+from bs4 import BeautifulSoup
+
+_LOGGER = logging.getLogger(__name__)
+
+VISIBLE_XS_XPATH = (
+    "p[contains(concat(' ', normalize-space(@class), ' '), ' visible-xs ')]"
+)
+SIM_ICON_XPATH = (
+    "//i[contains(concat(' ', normalize-space(@class), ' '), ' icon ')"
+    " and contains(@class, 'sim')]"
+)
+
+
+class HtmlBackend(ABC):
+    """Extracts the raw values from Cudy router pages."""
+
+    name: str
+    # The device list is parsed while downloading with DeviceCellTokenizer
+    # instead, when it's faster than parsing the whole page with the backend
+    stream_device_list = False
+
+    @abstractmethod
+    def table_rows(self, input_html: str) -> list[list[str]]:
+        """Returns the stripped, non-empty 'td p.visible-xs' texts of each table row"""
+
+    @abstractmethod
+    def sim_icon_classes(self, input_html: str) -> list[str] | None:
+        """Returns the class list of the SIM icon if there's any"""
+
+    @abstractmethod
+    def modem_page(self, input_html: str) -> tuple[list[list[str]], list[str] | None]:
+        """Returns both the table rows and the SIM icon classes in a single parse"""
+
+    @abstractmethod
+    def device_cells(self, input_html: str) -> list[list[tuple[str, str]]]:
+        """Returns (div ID, 'p.visible-xs' text) pairs of each table row
+
+        Line breaks are kept as new lines in the text.
+        """
+
+
+class SoupBackend(HtmlBackend):
+    """Pure Python backend using BeautifulSoup with html.parser."""
+
+    name = "html.parser"
+    stream_device_list = True
+
+    def table_rows(self, input_html: str) -> list[list[str]]:
+        return self._table_rows(BeautifulSoup(input_html, "html.parser"))
+
+    def sim_icon_classes(self, input_html: str) -> list[str] | None:
+        return self._sim_icon_classes(BeautifulSoup(input_html, "html.parser"))
+
+    def modem_page(self, input_html: str) -> tuple[list[list[str]], list[str] | None]:
+        soup = BeautifulSoup(input_html, "html.parser")
+        return self._table_rows(soup), self._sim_icon_classes(soup)
+
+    @staticmethod
+    def _table_rows(soup: BeautifulSoup) -> list[list[str]]:
+        rows: list[list[str]] = []
+        for table in soup.find_all("table"):
+            for row in table.find_all("tr"):
+                rows.append(
+                    [
+                        text
+                        for col in row.css.select("td p.visible-xs")
+                        if (text := col.text.strip())
+                    ]
+                )
+        return rows
+
+    @staticmethod
+    def _sim_icon_classes(soup: BeautifulSoup) -> list[str] | None:
+        sim_icon = soup.css.select_one("i.icon[class*='sim']")
+        return sim_icon and sim_icon.attrs["class"]
+
+    def device_cells(self, input_html: str) -> list[list[tuple[str, str]]]:
+        rows: list[list[tuple[str, str]]] = []
+        soup = BeautifulSoup(input_html, "html.parser")
+        for br_element in soup.find_all("br"):
+            br_element.replace_with("\n" + br_element.text)
+        for table in soup.find_all("table"):
+            for row in table.find_all("tr"):
+                cells: list[tuple[str, str]] = []
+                for col in row.css.select("td div"):
+                    div_id = col.attrs.get("id")
+                    content_element = col.css.select_one("p.visible-xs")
+                    if div_id and content_element:
+                        cells.append((div_id, content_element.text))
+                rows.append(cells)
+        return rows
+
+
+class LxmlBackend(HtmlBackend):
+    """C-backed backend using lxml."""
+
+    name = "lxml"
+
+    def __init__(self) -> None:
+        """Initialize."""
+        # pylint: disable-next=import-outside-toplevel
+        import lxml.html
+
+        self._fromstring = lxml.html.document_fromstring
+
+    def table_rows(self, input_html: str) -> list[list[str]]:
+        if not input_html.strip():
+            return []
+        return self._table_rows(self._fromstring(input_html))
+
+    def sim_icon_classes(self, input_html: str) -> list[str] | None:
+        if not input_html.strip():
+            return None
+        return self._sim_icon_classes(self._fromstring(input_html))
+
+    def modem_page(self, input_html: str) -> tuple[list[list[str]], list[str] | None]:
+        if not input_html.strip():
+            return [], None
+        document = self._fromstring(input_html)
+        return self._table_rows(document), self._sim_icon_classes(document)
+
+    @staticmethod
+    def _table_rows(document: Any) -> list[list[str]]:
+        return [
+            [
+                text
+                for col in row.xpath(f".//td//{VISIBLE_XS_XPATH}")
+                if (text := col.text_content().strip())
+            ]
+            for row in document.xpath("//table//tr")
+        ]
+
+    @staticmethod
+    def _sim_icon_classes(document: Any) -> list[str] | None:
+        sim_icons = document.xpath(SIM_ICON_XPATH)
+        return sim_icons[0].get("class").split() if sim_icons else None
+
+    def device_cells(self, input_html: str) -> list[list[tuple[str, str]]]:
+        if not input_html.strip():
+            return []
+        document = self._fromstring(input_html)
+        for br_element in document.iter("br"):
+            br_element.tail = "\n" + (br_element.tail or "")
+        rows: list[list[tuple[str, str]]] = []
+        for row in document.xpath("//table//tr"):
+            cells: list[tuple[str, str]] = []
+            for col in row.xpath(".//td//div[@id]"):
+                content_elements = col.xpath(f".//{VISIBLE_XS_XPATH}")
+                if col.get("id") and content_elements:
+                    cells.append((col.get("id"), content_elements[0].text_content()))
+            rows.append(cells)
+        return rows
+
+
+class SelectolaxBackend(HtmlBackend):
+    """C-backed backend using selectolax."""
+
+    name = "selectolax"
+
+    def __init__(self) -> None:
+        """Initialize."""
+        try:
+            # pylint: disable-next=import-outside-toplevel
+            from selectolax.lexbor import LexborHTMLParser as HTMLParser
+        except ImportError:
+            # Releases before the lexbor engine only have the Modest one
+            # pylint: disable-next=import-outside-toplevel
+            from selectolax.parser import HTMLParser
+
+        self._parser = HTMLParser
+
+    def table_rows(self, input_html: str) -> list[list[str]]:
+        return self._table_rows(self._parser(input_html))
+
+    def sim_icon_classes(self, input_html: str) -> list[str] | None:
+        return self._sim_icon_classes(self._parser(input_html))
+
+    def modem_page(self, input_html: str) -> tuple[list[list[str]], list[str] | None]:
+        tree = self._parser(input_html)
+        return self._table_rows(tree), self._sim_icon_classes(tree)
+
+    @staticmethod
+    def _table_rows(tree: Any) -> list[list[str]]:
+        return [
+            [
+                text
+                for col in row.css("td p.visible-xs")
+                if (text := col.text(deep=True).strip())
+            ]
+            for row in tree.css("table tr")
+        ]
+
+    @staticmethod
+    def _sim_icon_classes(tree: Any) -> list[str] | None:
+        sim_icon = tree.css_first("i.icon[class*='sim']")
+        return sim_icon and (sim_icon.attributes.get("class") or "").split()
+
+    def device_cells(self, input_html: str) -> list[list[tuple[str, str]]]:
+        tree = self._parser(input_html)
+        for br_element in tree.css("br"):
+            br_element.replace_with("\n")
+        rows: list[list[tuple[str, str]]] = []
+        for row in tree.css("table tr"):
+            cells: list[tuple[str, str]] = []
+            for col in row.css("td div"):
+                div_id = col.attributes.get("id")
+                content_element = col.css_first("p.visible-xs")
+                if div_id and content_element:
+                    cells.append((div_id, content_element.text(deep=True)))
+            rows.append(cells)
+        return rows
+
+
+class DeviceCellTokenizer(HTMLParser):
+    """Event-driven extractor of the device list cells
+
+    Produces the same cells as HtmlBackend.device_cells, but it can be fed
+    chunk by chunk and hands over each table row as soon as it's closed, so
+    only the current row is kept in memory.
+    """
+
+    def __init__(self, on_row: Callable[[list[tuple[str, str]]], None]) -> None:
+        """Initialize."""
+        self._on_row = on_row
+        super().__init__()
+
+    def reset(self) -> None:
+        """Drops the state of a partially fed page."""
+        super().reset()
+        self._table_depth = 0
+        self._td_depth = 0
+        self._in_row = False
+        # Open divs as cell indexes; None for divs without ID or outside cells
+        self._div_stack: list[int | None] = []
+        self._cells: list[tuple[str, str | None]] = []
+        self._text: list[str] | None = None
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        if tag == "table":
+            self._table_depth += 1
+        elif not self._table_depth:
+            return
+        elif tag == "tr":
+            self._close_row()
+            self._in_row = True
+        elif tag == "td" and self._in_row:
+            self._td_depth += 1
+        elif tag == "div":
+            div_id = dict(attrs).get("id") if self._td_depth else None
+            if div_id:
+                self._div_stack.append(len(self._cells))
+                self._cells.append((div_id, None))
+            else:
+                self._div_stack.append(None)
+        elif tag == "p" and self._text is None and self._waiting_for_content():
+            if "visible-xs" in (dict(attrs).get("class") or "").split():
+                self._text = []
+        elif tag == "br" and self._text is not None:
+            self._text.append("\n")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "table" and self._table_depth:
+            self._close_row()
+            self._table_depth -= 1
+        elif not self._table_depth:
+            return
+        elif tag == "tr":
+            self._close_row()
+        elif tag == "td" and self._td_depth:
+            self._finish_text()
+            self._td_depth -= 1
+        elif tag == "div" and self._div_stack:
+            self._finish_text()
+            self._div_stack.pop()
+        elif tag == "p":
+            self._finish_text()
+
+    def handle_data(self, data: str) -> None:
+        if self._text is not None:
+            self._text.append(data)
+
+    def close(self) -> None:
+        """Flushes the buffered input and the last row."""
+        super().close()
+        self._close_row()
+
+    def _finish_text(self) -> None:
+        """Assigns the captured paragraph to the open divs still without content."""
+        if self._text is None:
+            return
+        content = "".join(self._text)
+        self._text = None
+        for index in self._div_stack:
+            if index is not None and self._cells[index][1] is None:
+                self._cells[index] = (self._cells[index][0], content)
+
+    def _waiting_for_content(self) -> bool:
+        return any(
+            index is not None and self._cells[index][1] is None
+            for index in self._div_stack
+        )
+
+    def _close_row(self) -> None:
+        if self._in_row:
+            self._on_row(
+                [
+                    (div_id, content)
+                    for div_id, content in self._cells
+                    if content is not None
+                ]
+            )
+        self._in_row = False
+        self._td_depth = 0
+        self._div_stack = []
+        self._cells = []
+        self._text = None
+
+
+BACKENDS: dict[str, type[HtmlBackend]] = {
+    SelectolaxBackend.name: SelectolaxBackend,
+    LxmlBackend.name: LxmlBackend,
+    SoupBackend.name: SoupBackend,
+}
+
+
+def get_backend(name: str | None = None) -> HtmlBackend:
+    """Returns the given backend, or the fastest one that is installed"""
+
+    if name:
+        return BACKENDS[name]()
+    for backend_class in BACKENDS.values():
+        try:
+            return backend_class()
+        except ImportError:
+            continue
+    return SoupBackend()
+
+
+BACKEND = get_backend()
+_LOGGER.debug("Parsing HTML with %s", BACKEND.name)
@@ -1,112 +1,493 @@
 """Provides the backend for a Cudy router"""
 
-from datetime import timedelta
-from typing import Any
-import requests
+import asyncio
+import codecs
+from collections.abc import AsyncIterator, Callable, Coroutine, Iterable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, TypeVar
 import logging
+import time
 import urllib.parse
-from http.cookies import SimpleCookie
 
-from .const import MODULE_DEVICES, MODULE_MODEM, OPTIONS_DEVICELIST
-from .parser import parse_devices, parse_modem_info
+from aiohttp import ClientError, ClientTimeout, DummyCookieJar
 
-from homeassistant.core import HomeAssistant
+from .const import (
+    DEFAULT_PARSE_MODE,
+    DEFAULT_POOL_SIZE,
+    MODULE_DEVICES,
+    MODULE_MODEM,
+    PARSE_MODE_EXECUTOR,
+    PARSE_MODE_INLINE,
+)
+from .models import DevicesSnapshot, ModemSnapshot, Snapshot
+from .page_cache import PageCache, page_hash
+from .parser_backends import BACKEND
+from .scheduler import Limiter, ProcessPool
+from .parser import (
+    DeviceListStream,
+    parse_device_list,
+    parse_device_page,
+    parse_modem_page,
+)
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.aiohttp_client import async_create_clientsession
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
 
 _LOGGER = logging.getLogger(__name__)
+_T = TypeVar("_T")
 
 MIN_TIME_BETWEEN_UPDATES = timedelta(seconds=15)
 SCAN_INTERVAL = timedelta(seconds=30)
 RETRY_INTERVAL = timedelta(seconds=300)
+REQUEST_TIMEOUT = ClientTimeout(total=30)
+PROBE_TIMEOUT = ClientTimeout(total=5)
+STREAM_CHUNK_SIZE = 16384
+MODEM_SUMMARY_URL = "admin/network/gcom/status"
+MODEM_DETAIL_URL = "admin/network/gcom/status?detail=1"
+DEVICES_URL = "admin/network/devices/devlist?detail=1"
+# Short names of the pages in the diagnostics
+PAGE_NAMES = {
+    MODEM_SUMMARY_URL: "modem_summary",
+    MODEM_DETAIL_URL: "modem_detail",
+    DEVICES_URL: "devices",
+}
+# LuCI drops idle sessions after an hour unless the cookie says otherwise
+AUTH_SESSION_LIFETIME = timedelta(seconds=3600)
+AUTH_REFRESH_MARGIN = timedelta(seconds=60)
+AUTH_SAVE_DELAY = 10
+# A failed login is the outcome for every login wanted within this time, so a
+# wrong password doesn't make each request of a poll log in again
+AUTH_RETRY_DELAY = timedelta(seconds=10)
+
+
+@dataclass
+class RouterStats:
+    """Timings of the last poll and counters of the communication with a router."""
+
+    # Milliseconds of the last download of each page and of parsing each module
+    fetch_ms: dict[str, float] = field(default_factory=dict)
+    parse_ms: dict[str, float] = field(default_factory=dict)
+    login_ms: float | None = None
+    # Milliseconds the last poll waited for the limits shared by the routers
+    queue_ms: float = 0.0
+    logins: int = 0
+    bytes_downloaded: int = 0
 
 
 class CudyRouter:
     """Represents a router and provides functions for communication."""
 
     def __init__(
-        self, hass: HomeAssistant, host: str, username: str, password: str
+        self,
+        hass: HomeAssistant,
+        host: str,
+        username: str,
+        password: str,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        parse_limiter: Limiter | None = None,
+        parse_mode: str = DEFAULT_PARSE_MODE,
+        process_pool: ProcessPool | None = None,
     ) -> None:
-        """Initialize."""
+        """Initialize.
+
+        The parse limiter is shared with other routers to limit the concurrent
+        parses, see CudyRouterScheduler. The process pool is used by the
+        process parse mode.
+        """
         self.host = host
         self.auth_cookie = None
+        self.auth_expires = None
         self.hass = hass
         self.username = username
         self.password = password
+        # Connections come from the connector shared by Home Assistant, which also
+        # closes the session. The sysauth cookie is managed by hand, not by a
+        # shared cookie jar
+        self.session = async_create_clientsession(hass, cookie_jar=DummyCookieJar())
+        # Limits the parallel requests to the router
+        self._request_slots = asyncio.Semaphore(pool_size)
+        self._parse_limiter = parse_limiter or Limiter(1)
+        self.parse_mode = parse_mode
+        self._process_pool = process_pool
+        self._auth_lock = asyncio.Lock()
+        self._auth_failed_at: datetime | None = None
+        self._auth_store: Store[dict[str, Any]] | None = None
+        # Modem pages to fetch and the fields they provided when probed
+        self.modem_pages: tuple[str, ...] | None = None
+        self._modem_fields: frozenset[str] = frozenset()
+        self.successful_requests = 0
+        self.page_cache = PageCache()
+        self.stats = RouterStats()
+
+    async def async_restore_auth(self, store: Store[dict[str, Any]]) -> None:
+        """Restores the session cookie saved before the last restart.
+
+        The cookie is not checked here: the first request falling back to a
+        login on 403 is cheaper than a login on every startup.
+        """
+
+        self._auth_store = store
+        stored = await store.async_load()
+        if not stored or not stored.get("cookie"):
+            return
+        expires = dt_util.parse_datetime(stored.get("expires") or "")
+        if not expires or dt_util.utcnow() >= expires - AUTH_REFRESH_MARGIN:
+            return
+        self.auth_cookie = stored["cookie"]
+        self.auth_expires = expires
 
-    def get_cookie_header(self, force_auth: bool) -> str:
+    @callback
+    def _auth_data(self) -> dict[str, Any]:
+        """Returns the session cookie data to be saved."""
+
+        return {
+            "cookie": self.auth_cookie,
+            "timestamp": dt_util.utcnow().isoformat(),
+            "expires": self.auth_expires and self.auth_expires.isoformat(),
+        }
+
+    def is_auth_expiring(self) -> bool:
+        """Checks if the session cookie is about to expire."""
+
+        return (
+            self.auth_expires is not None
+            and dt_util.utcnow() >= self.auth_expires - AUTH_REFRESH_MARGIN
+        )
+
+    async def get_cookie_header(self, force_auth: bool) -> str:
         """Returns a cookie header that should be used for authentication."""
 
-        if not force_auth and self.auth_cookie:
-            return f"sysauth={self.auth_cookie}"
-        if self.authenticate():
-            return f"sysauth={self.auth_cookie}"
-        else:
-            return ""
+        cookie = self.auth_cookie
+        if force_auth or not cookie or self.is_auth_expiring():
+            if not await self.reauthenticate(cookie):
+                return ""
+        return f"sysauth={self.auth_cookie}"
+
+    async def reauthenticate(self, stale_cookie: str | None) -> bool:
+        """Replaces the stale session cookie, logging in at most once at a time.
 
-    def authenticate(self) -> bool:
+        Callers waiting for a login that is already running reuse its cookie
+        instead of starting another one. A failed login is shared the same way,
+        with the callers until AUTH_RETRY_DELAY has passed.
+        """
+
+        async with self._auth_lock:
+            if (
+                self.auth_cookie
+                and self.auth_cookie != stale_cookie
+                and not self.is_auth_expiring()
+            ):
+                return True
+            if (
+                self._auth_failed_at is not None
+                and dt_util.utcnow() < self._auth_failed_at + AUTH_RETRY_DELAY
+            ):
+                return False
+            if await self.authenticate():
+                self._auth_failed_at = None
+                return True
+            self._auth_failed_at = dt_util.utcnow()
+            return False
+
+    async def async_is_reachable(self) -> bool:
+        """Checks cheaply if the web server of the router answers at all."""
+
+        try:
+            async with self.session.head(
+                f"http://{self.host}/", timeout=PROBE_TIMEOUT, allow_redirects=False
+            ):
+                return True
+        except (asyncio.TimeoutError, ClientError):
+            return False
+
+    async def authenticate(self) -> bool:
         """Test if we can authenticate with the host."""
 
         data_url = f"http://{self.host}/cgi-bin/luci"
         headers = {"Content-Type": "application/x-www-form-urlencoded", "Cookie": ""}
         body = f"luci_username={urllib.parse.quote(self.username)}&luci_password={urllib.parse.quote(self.password)}&luci_language=en"
 
+        started = time.perf_counter()
         try:
-            response = requests.post(
-                data_url, timeout=30, headers=headers, data=body, allow_redirects=False
-            )
-            if response.ok:
-                cookie = SimpleCookie()
-                cookie.load(response.headers.get("set-cookie"))
-                self.auth_cookie = cookie.get("sysauth").value
-                return True
-        except requests.exceptions.ConnectionError:
+            async with self.session.post(
+                data_url,
+                timeout=REQUEST_TIMEOUT,
+                headers=headers,
+                data=body,
+                allow_redirects=False,
+            ) as response:
+                cookie = response.cookies.get("sysauth")
+                if response.ok and cookie:
+                    lifetime = AUTH_SESSION_LIFETIME
+                    if max_age := cookie["max-age"]:
+                        try:
+                            # A negative max-age expires the cookie right away
+                            lifetime = timedelta(seconds=max(int(max_age), 0))
+                        except ValueError:
+                            _LOGGER.debug("Invalid session max-age: %s", max_age)
+                    self.auth_cookie = cookie.value
+                    self.auth_expires = dt_util.utcnow() + lifetime
+                    self.stats.logins += 1
+                    self.stats.login_ms = (time.perf_counter() - started) * 1000
+                    if self._auth_store:
+                        self._auth_store.async_delay_save(
+                            self._auth_data, AUTH_SAVE_DELAY
+                        )
+                    return True
+        except (asyncio.TimeoutError, ClientError):
             _LOGGER.debug("Connection error?")
         return False
 
-    def get(self, url: str) -> str:
-        """Retrieves data from the given URL using an authenticated session."""
+    async def get(self, url: str, stream: DeviceListStream | None = None) -> str:
+        """Retrieves data from the given URL using an authenticated session.
 
-        retries = 2
-        while retries > 0:
-            retries -= 1
+        With a stream, the body is fed to it while downloading, and an empty
+        string is returned. Raises ConnectionError when the page could not be
+        retrieved.
+        """
 
-            data_url = f"http://{self.host}/cgi-bin/luci/{url}"
-            headers = {"Cookie": f"{self.get_cookie_header(False)}"}
+        # Requests waiting for a slot don't use up their timeout in the connector queue
+        async with self._request_slots:
+            retries = 2
+            while retries > 0:
+                retries -= 1
 
-            try:
-                response = requests.get(
-                    data_url, timeout=30, headers=headers, allow_redirects=False
-                )
-                if response.status_code == 403:
-                    if self.authenticate():
-                        continue
-                    else:
+                data_url = f"http://{self.host}/cgi-bin/luci/{url}"
+                headers = {
+                    "Cookie": f"{await self.get_cookie_header(False)}",
+                    **self.page_cache.request_headers(url),
+                }
+                cookie = self.auth_cookie
+
+                started = time.perf_counter()
+                try:
+                    async with self.session.get(
+                        data_url,
+                        timeout=REQUEST_TIMEOUT,
+                        headers=headers,
+                        allow_redirects=False,
+                    ) as response:
+                        if response.status == 304 and url in self.page_cache.pages:
+                            self._record_fetch(url, started)
+                            return self.page_cache.not_modified(url) or ""
+                        etag = response.headers.get("ETag")
+                        last_modified = response.headers.get("Last-Modified")
+                        charset = response.charset or "utf-8"
+                        if response.ok and stream is None:
+                            body = await response.read()
+                            self.stats.bytes_downloaded += len(body)
+                            text = self.page_cache.update(
+                                url,
+                                page_hash(body).digest(),
+                                lambda: body.decode(charset, errors="replace"),
+                                etag,
+                                last_modified,
+                            )
+                            self._record_fetch(url, started)
+                            return text
+                        if response.ok:
+                            stream.reset()
+                            digest = page_hash()
+                            decoder = codecs.getincrementaldecoder(charset)(
+                                errors="replace"
+                            )
+                            async for chunk in response.content.iter_chunked(
+                                STREAM_CHUNK_SIZE
+                            ):
+                                self.stats.bytes_downloaded += len(chunk)
+                                digest.update(chunk)
+                                stream.feed(decoder.decode(chunk))
+                            stream.feed(decoder.decode(b"", final=True))
+                            self.page_cache.update(
+                                url, digest.digest(), None, etag, last_modified
+                            )
+                            # Parsing while downloading is counted as parse time
+                            self._record_fetch(url, started + stream.parse_time)
+                            return ""
+                        status = response.status
+                    # Log in only after the connection went back to the pool
+                    if status == 403:
+                        if await self.reauthenticate(cookie):
+                            continue
                         _LOGGER.error("Error during authentication to %s", url)
-                        break
-                if response.ok:
-                    return response.text
-                else:
                     break
-            except Exception:  # pylint: disable=broad-except
-                pass
+                except Exception:  # pylint: disable=broad-except
+                    pass
 
+        if stream is not None:
+            stream.reset()
+        self.page_cache.invalidate(url)
         _LOGGER.error("Error retrieving data from %s", url)
-        return ""
+        raise ConnectionError(f"Error retrieving data from {url}")
+
+    async def _get_or_none(self, url: str) -> str | None:
+        """Retrieves the page, or None when it could not be retrieved."""
+
+        try:
+            return await self.get(url)
+        except ConnectionError:
+            return None
+
+    def _record_fetch(self, url: str, started: float) -> None:
+        """Records a successful request and its duration since started."""
+
+        self.successful_requests += 1
+        self.stats.fetch_ms[url] = (time.perf_counter() - started) * 1000
+
+    @asynccontextmanager
+    async def _queued(self, limiter: Limiter) -> AsyncIterator[None]:
+        """Holds the limiter, adding the time waiting for it to the stats."""
+
+        started = time.perf_counter()
+        async with limiter:
+            self.stats.queue_ms += (time.perf_counter() - started) * 1000
+            yield
+
+    async def _parse(self, module: str, parse: Callable[..., _T], *args: Any) -> _T:
+        """Parses the data of the module within the shared parse limit.
+
+        Outside of the inline mode, the arguments and the result are passed
+        between threads or processes, they must be picklable plain data.
+        """
+
+        async with self._queued(self._parse_limiter):
+            started = time.perf_counter()
+            try:
+                if self.parse_mode == PARSE_MODE_INLINE:
+                    return parse(*args)
+                if self.parse_mode == PARSE_MODE_EXECUTOR:
+                    return await self.hass.async_add_executor_job(parse, *args)
+                return await self._process_pool.async_run(parse, *args)
+            finally:
+                self._add_parse_time(module, time.perf_counter() - started)
+
+    def _add_parse_time(self, module: str, seconds: float) -> None:
+        """Adds to the parse time of the module in the last poll."""
+
+        self.stats.parse_ms[module] = (
+            self.stats.parse_ms.get(module, 0.0) + seconds * 1000
+        )
 
     async def get_data(
-        self, hass: HomeAssistant, options: dict[str, Any]
-    ) -> dict[str, Any]:
-        """Retrieves data from the router"""
+        self,
+        device_index: frozenset[str],
+        modules: Iterable[str] = (MODULE_MODEM, MODULE_DEVICES),
+        detail_all: bool = False,
+    ) -> dict[str, Snapshot]:
+        """Retrieves data of the given modules from the router
 
-        data: dict[str, Any] = {}
+        Devices in the index (see build_device_index) get detailed reports,
+        or every device with detail_all. Modules whose pages could not be
+        retrieved are left out, the coordinator keeps their last data.
+        """
+
+        requests: dict[str, Coroutine[Any, Any, Snapshot]] = {}
+        if MODULE_MODEM in modules:
+            requests[MODULE_MODEM] = self.get_modem_info()
+        if MODULE_DEVICES in modules:
+            requests[MODULE_DEVICES] = self.get_devices(device_index, detail_all)
+
+        # Timings are kept for the last poll only
+        self.stats.fetch_ms = {}
+        self.stats.parse_ms = {}
+        self.stats.queue_ms = 0.0
+        data: dict[str, Snapshot] = {}
+        results = await asyncio.gather(*requests.values(), return_exceptions=True)
+        for module, result in zip(requests, results):
+            if isinstance(result, ConnectionError):
+                continue
+            if isinstance(result, BaseException):
+                raise result
+            data[module] = result
+        if not data:
+            raise ConnectionError(f"No page could be retrieved from {self.host}")
+        return data
 
-        data[MODULE_MODEM] = parse_modem_info(
-            f"{await hass.async_add_executor_job(self.get, 'admin/network/gcom/status')}{await hass.async_add_executor_job(self.get, 'admin/network/gcom/status?detail=1')}"
+    async def get_devices(
+        self, device_index: frozenset[str], detail_all: bool = False
+    ) -> DevicesSnapshot:
+        """Retrieves the connected devices"""
+
+        if self.parse_mode != PARSE_MODE_INLINE or not BACKEND.stream_device_list:
+            # Parsed at once, by a C-backed engine or off the loop, instead of by
+            # the pure Python tokenizer while downloading
+            page = await self.get(DEVICES_URL)
+            if (data := self.page_cache.get_result((DEVICES_URL,))) is None:
+                data = await self._parse(
+                    MODULE_DEVICES, parse_device_page, page, device_index, detail_all
+                )
+                self.page_cache.set_result((DEVICES_URL,), data)
+            return data
+
+        devices = DeviceListStream()
+        await self.get(DEVICES_URL, devices)
+        if (data := self.page_cache.get_result((DEVICES_URL,))) is None:
+            data = await self._parse(
+                MODULE_DEVICES,
+                parse_device_list,
+                devices.close(),
+                device_index,
+                detail_all,
+            )
+            self.page_cache.set_result((DEVICES_URL,), data)
+        # The page itself was parsed while downloading
+        self._add_parse_time(MODULE_DEVICES, devices.parse_time)
+        return data
+
+    async def get_modem_info(self) -> ModemSnapshot:
+        """Retrieves the modem info from the pages selected by probing"""
+
+        if self.modem_pages is None:
+            return await self.probe_modem_pages()
+
+        pages = await asyncio.gather(*(self.get(url) for url in self.modem_pages))
+        if (data := self.page_cache.get_result(self.modem_pages)) is not None:
+            return data
+        data, fields = await self._parse(MODULE_MODEM, parse_modem_page, "".join(pages))
+        # A firmware update may have moved fields between the pages
+        if not self._modem_fields <= fields:
+            _LOGGER.debug("Modem page fields of %s changed, probing again", self.host)
+            return await self.probe_modem_pages()
+        self.page_cache.set_result(self.modem_pages, data)
+        return data
+
+    async def probe_modem_pages(self) -> ModemSnapshot:
+        """Finds which modem pages provide the used fields and returns the modem info.
+
+        The detail page usually repeats everything from the summary page, so the
+        summary page is only fetched when it provides something extra.
+        """
+
+        summary, detail = await asyncio.gather(
+            self._get_or_none(MODEM_SUMMARY_URL), self._get_or_none(MODEM_DETAIL_URL)
+        )
+        if summary is None and detail is None:
+            raise ConnectionError(f"No modem page could be retrieved from {self.host}")
+        summary_data, summary_fields = await self._parse(
+            MODULE_MODEM, parse_modem_page, summary or ""
         )
-        data[MODULE_DEVICES] = parse_devices(
-            await hass.async_add_executor_job(
-                self.get, "admin/network/devices/devlist?detail=1"
-            ),
-            options and options.get(OPTIONS_DEVICELIST),
+        detail_data, detail_fields = await self._parse(
+            MODULE_MODEM, parse_modem_page, detail or ""
         )
+        fields = summary_fields | detail_fields
+        if fields <= detail_fields:
+            pages, data = (MODEM_DETAIL_URL,), detail_data
+        elif fields <= summary_fields:
+            pages, data = (MODEM_SUMMARY_URL,), summary_data
+        else:
+            pages = (MODEM_SUMMARY_URL, MODEM_DETAIL_URL)
+            data = (
+                await self._parse(MODULE_MODEM, parse_modem_page, f"{summary}{detail}")
+            )[0]
 
+        # Failed downloads don't tell anything about the firmware
+        if summary is not None and detail is not None:
+            _LOGGER.debug("Using modem pages %s for %s", pages, self.host)
+            self.modem_pages = pages
+            self._modem_fields = fields
+            self.page_cache.set_result(pages, data)
         return data
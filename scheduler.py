@@ -0,0 +1,183 @@
+"""Shared scheduling of the polls of every Cudy router in Home Assistant"""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import logging
+import multiprocessing
+from typing import Any, TypeVar
+
+from homeassistant.core import HomeAssistant, callback
+
+from .const import DATA_SCHEDULER, DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+_T = TypeVar("_T")
+
+# Polls and parses running at the same time, for all routers together
+MAX_CONCURRENT_POLLS = 8
+MAX_CONCURRENT_PARSES = 2
+
+
+class Limiter:
+    """Semaphore that counts the tasks holding it and waiting for it."""
+
+    def __init__(self, limit: int) -> None:
+        """Initialize."""
+        self.limit = limit
+        self.active = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def __aenter__(self) -> None:
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self.active -= 1
+        self._semaphore.release()
+
+    def as_dict(self) -> dict[str, int]:
+        """Returns the current usage."""
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+        }
+
+
+class ProcessPool:
+    """Process pool for parsing, replaced when one of its workers died.
+
+    Workers are spawned instead of forked, as forking the threads of Home
+    Assistant is unsafe.
+    """
+
+    def __init__(self, workers: int) -> None:
+        """Initialize."""
+        self.workers = workers
+        self.restarts = 0
+        self._executor = self._start()
+
+    def _start(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    async def async_run(self, function: Callable[..., _T], *args: Any) -> _T:
+        """Runs the function in a worker, in a new pool if the pool is broken"""
+        loop = asyncio.get_running_loop()
+        executor = self._executor
+        try:
+            return await loop.run_in_executor(executor, function, *args)
+        except BrokenProcessPool:
+            # A single dead worker, e.g. killed for its memory, breaks the pool
+            if executor is self._executor:
+                _LOGGER.warning("A parse worker died, starting a new process pool")
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._start()
+                self.restarts += 1
+            return await loop.run_in_executor(self._executor, function, *args)
+
+    def shutdown(self) -> None:
+        """Stops the workers without waiting for them."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class CudyRouterScheduler:
+    """Spreads the polls of the routers and limits the work done at once.
+
+    Each router gets a slot, a fraction of its poll interval on a clock shared
+    by all routers. New routers take the middle of the largest gap between the
+    slots, so the polls are evenly spread without moving existing ones.
+
+    Polls are admitted as a whole, so a poll that started is not slowed down
+    by the requests of other routers.
+    """
+
+    def __init__(
+        self,
+        max_polls: int = MAX_CONCURRENT_POLLS,
+        max_parses: int = MAX_CONCURRENT_PARSES,
+    ) -> None:
+        """Initialize."""
+        self.polls = Limiter(max_polls)
+        self.parses = Limiter(max_parses)
+        self._slots: dict[str, float] = {}
+        self._process_pool: ProcessPool | None = None
+
+    @property
+    def routers(self) -> int:
+        """Returns the number of registered routers."""
+        return len(self._slots)
+
+    @callback
+    def async_register(self, router_id: str) -> float:
+        """Returns the slot of the router, between 0 and 1."""
+        if router_id in self._slots:
+            return self._slots[router_id]
+        slots = sorted(self._slots.values())
+        slot = 0.0
+        if slots:
+            # Gaps between neighbouring slots, the last one wrapping around
+            gaps = zip(slots, slots[1:] + [slots[0] + 1])
+            start, end = max(gaps, key=lambda gap: gap[1] - gap[0])
+            slot = ((start + end) / 2) % 1
+        self._slots[router_id] = slot
+        return slot
+
+    @callback
+    def async_unregister(self, router_id: str) -> None:
+        """Frees the slot of the router."""
+        self._slots.pop(router_id, None)
+
+    @callback
+    def async_get_process_pool(self) -> ProcessPool:
+        """Returns the process pool for parsing, starting it when needed.
+
+        It has a worker for each parse allowed at once.
+        """
+        if self._process_pool is None:
+            self._process_pool = ProcessPool(self.parses.limit)
+        return self._process_pool
+
+    @callback
+    def async_shutdown(self) -> None:
+        """Stops the process pool without waiting for the workers."""
+        if self._process_pool is not None:
+            self._process_pool.shutdown()
+            self._process_pool = None
+
+    def as_dict(self) -> dict[str, Any]:
+        """Returns the slots and the usage of the limits."""
+        return {
+            "routers": self.routers,
+            "slots": sorted(self._slots.values()),
+            "polls": self.polls.as_dict(),
+            "parses": self.parses.as_dict(),
+            "process_pool": self._process_pool is not None,
+            "process_pool_restarts": (
+                self._process_pool.restarts if self._process_pool else 0
+            ),
+        }
+
+
+@callback
+def async_get_scheduler(hass: HomeAssistant) -> CudyRouterScheduler:
+    """Returns the scheduler shared by the routers, creating it when needed."""
+
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if DATA_SCHEDULER not in domain_data:
+        domain_data[DATA_SCHEDULER] = CudyRouterScheduler()
+    return domain_data[DATA_SCHEDULER]
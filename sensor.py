@@ -1,18 +1,23 @@
 """Support for Cudy Router Sensor Platform."""
 from __future__ import annotations
 from dataclasses import dataclass
+from functools import cache
 
 import re
 from typing import Any
 
 from .const import (
+    DEFAULT_IDLE_TIMEOUT,
     DOMAIN,
     MODULE_DEVICES,
     MODULE_MODEM,
+    MODULE_STATISTICS,
+    MODULE_TRAFFIC,
     OPTIONS_DEVICELIST,
-    SECTION_DETAILED,
+    OPTIONS_IDLE_TIMEOUT,
 )
 from .coordinator import CudyRouterDataUpdateCoordinator
+from .models import Snapshot, StatisticsSnapshot
 
 from homeassistant.components.sensor import (
     SensorEntity,
@@ -26,10 +31,11 @@ from homeassistant.const import (
     SIGNAL_STRENGTH_DECIBELS,
     SIGNAL_STRENGTH_DECIBELS_MILLIWATT,
     UnitOfDataRate,
+    UnitOfInformation,
     UnitOfTime,
 )
 from homeassistant.core import HomeAssistant, callback
-from homeassistant.helpers.entity import DeviceInfo
+from homeassistant.helpers.entity import DeviceInfo, EntityCategory
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.typing import StateType
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
@@ -197,6 +203,90 @@ SENSOR_TYPES = {
         icon="mdi:upload",
         state_class=SensorStateClass.MEASUREMENT,
     ),
+    ("traffic", "total_downloaded"): CudyRouterSensorEntityDescription(
+        key="total_downloaded",
+        module="traffic",
+        name_suffix="total downloaded",
+        device_class=SensorDeviceClass.DATA_SIZE,
+        native_unit_of_measurement=UnitOfInformation.BYTES,
+        suggested_unit_of_measurement=UnitOfInformation.GIGABYTES,
+        icon="mdi:download",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+    ),
+    ("traffic", "total_uploaded"): CudyRouterSensorEntityDescription(
+        key="total_uploaded",
+        module="traffic",
+        name_suffix="total uploaded",
+        device_class=SensorDeviceClass.DATA_SIZE,
+        native_unit_of_measurement=UnitOfInformation.BYTES,
+        suggested_unit_of_measurement=UnitOfInformation.GIGABYTES,
+        icon="mdi:upload",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+    ),
+    ("diagnostics", "poll_duration"): CudyRouterSensorEntityDescription(
+        key="poll_duration",
+        module="diagnostics",
+        name_suffix="last poll duration",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        icon="mdi:timer-outline",
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+    ("diagnostics", "fetch_time"): CudyRouterSensorEntityDescription(
+        key="fetch_time",
+        module="diagnostics",
+        name_suffix="slowest page fetch time",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        icon="mdi:timer-outline",
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+    ("diagnostics", "parse_time"): CudyRouterSensorEntityDescription(
+        key="parse_time",
+        module="diagnostics",
+        name_suffix="parse time",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        icon="mdi:timer-cog-outline",
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+    ("diagnostics", "queue_wait"): CudyRouterSensorEntityDescription(
+        key="queue_wait",
+        module="diagnostics",
+        name_suffix="queue wait time",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        icon="mdi:timer-sand",
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+    ("diagnostics", "logins"): CudyRouterSensorEntityDescription(
+        key="logins",
+        module="diagnostics",
+        name_suffix="logins",
+        icon="mdi:login",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+    ("diagnostics", "bytes_downloaded"): CudyRouterSensorEntityDescription(
+        key="bytes_downloaded",
+        module="diagnostics",
+        name_suffix="downloaded",
+        device_class=SensorDeviceClass.DATA_SIZE,
+        native_unit_of_measurement=UnitOfInformation.BYTES,
+        icon="mdi:download-network-outline",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
 }
 
 
@@ -234,6 +324,37 @@ DEVICE_DOWNLOAD_SENSOR = CudyRouterSensorEntityDescription(
     state_class=SensorStateClass.MEASUREMENT,
 )
 
+DEVICE_DOWNLOADED_SENSOR = CudyRouterSensorEntityDescription(
+    key="downloaded",
+    module="traffic",
+    name_suffix="downloaded",
+    device_class=SensorDeviceClass.DATA_SIZE,
+    native_unit_of_measurement=UnitOfInformation.BYTES,
+    suggested_unit_of_measurement=UnitOfInformation.MEGABYTES,
+    icon="mdi:download",
+    state_class=SensorStateClass.TOTAL_INCREASING,
+)
+
+DEVICE_UPLOADED_SENSOR = CudyRouterSensorEntityDescription(
+    key="uploaded",
+    module="traffic",
+    name_suffix="uploaded",
+    device_class=SensorDeviceClass.DATA_SIZE,
+    native_unit_of_measurement=UnitOfInformation.BYTES,
+    suggested_unit_of_measurement=UnitOfInformation.MEGABYTES,
+    icon="mdi:upload",
+    state_class=SensorStateClass.TOTAL_INCREASING,
+)
+
+DEVICE_SENSORS = (
+    DEVICE_MAC_SENSOR,
+    DEVICE_HOSTNAME_SENSOR,
+    DEVICE_UPLOAD_SENSOR,
+    DEVICE_DOWNLOAD_SENSOR,
+    DEVICE_DOWNLOADED_SENSOR,
+    DEVICE_UPLOADED_SENSOR,
+)
+
 
 def as_name(input_str: str) -> str:
     """Replaces any non-alphanumeric characters with underscore"""
@@ -243,6 +364,45 @@ def as_name(input_str: str) -> str:
     return re.sub("[^0-9a-zA-Z]", "_", input_str)
 
 
+def device_unique_id(entry_id: str, device_id: str, key: str) -> str:
+    """Returns the unique ID of a device sensor"""
+
+    return f"{entry_id}-{as_name(device_id)}-{key}"
+
+
+def device_sensors(
+    coordinator: CudyRouterDataUpdateCoordinator, name: str, device_id: str
+) -> list[CudyRouterDeviceSensor]:
+    """Creates every sensor of a device"""
+
+    return [
+        CudyRouterDeviceSensor(coordinator, name, device_id, description)
+        for description in DEVICE_SENSORS
+    ]
+
+
+@cache
+def with_unrecorded_statistics(
+    sensor_class: type[CudyRouterSensor], windows: tuple[int, ...]
+) -> type[CudyRouterSensor]:
+    """Returns the sensor class keeping the statistics out of the recorder
+
+    The statistics change on every poll, so the recorder would store new
+    attributes with every state. Their names depend on the configured
+    windows, while Home Assistant reads the unrecorded attributes of the
+    class, hence a subclass for each set of windows.
+    """
+
+    return type(
+        sensor_class.__name__,
+        (sensor_class,),
+        {
+            "_unrecorded_attributes": sensor_class._unrecorded_attributes
+            | StatisticsSnapshot.attribute_names(windows)
+        },
+    )
+
+
 async def async_setup_entry(
     hass: HomeAssistant,
     config_entry: ConfigEntry,
@@ -255,23 +415,26 @@ async def async_setup_entry(
     ]
     name = as_name(config_entry.data.get(CONF_NAME) or config_entry.data.get(CONF_HOST))
     entities = []
-
-    for module, sensors in coordinator.data.items():
-        for sensor_label in sensors:
-            sensor_description = SENSOR_TYPES.get((module, sensor_label))
-            if sensor_description:
-                entities.append(
-                    CudyRouterSensor(
-                        coordinator,
-                        name,
-                        sensor_label,
-                        sensor_description,
-                    )
-                )
-    entities.append(CudyRouterSignalSensor(coordinator, name, "signal", SIGNAL_SENSOR))
-    entities.append(
-        CudyRouterSignalSensor(coordinator, name, "network", NETWORK_SENSOR)
+    sensor_class = with_unrecorded_statistics(
+        CudyRouterSensor, coordinator.statistics_windows
+    )
+    signal_sensor_class = with_unrecorded_statistics(
+        CudyRouterSignalSensor, coordinator.statistics_windows
     )
+
+    # Modules without data, e.g. the modem of routers without LTE, have
+    # unavailable sensors
+    for (_, sensor_label), sensor_description in SENSOR_TYPES.items():
+        entities.append(
+            sensor_class(
+                coordinator,
+                name,
+                sensor_label,
+                sensor_description,
+            )
+        )
+    entities.append(signal_sensor_class(coordinator, name, "signal", SIGNAL_SENSOR))
+    entities.append(signal_sensor_class(coordinator, name, "network", NETWORK_SENSOR))
     options = config_entry.options
     device_list = [
         x.strip()
@@ -281,20 +444,77 @@ async def async_setup_entry(
     for device_id in device_list:
         if not device_id:
             continue
-        entities.append(
-            CudyRouterDeviceSensor(coordinator, name, device_id, DEVICE_MAC_SENSOR)
-        )
-        entities.append(
-            CudyRouterDeviceSensor(coordinator, name, device_id, DEVICE_HOSTNAME_SENSOR)
+        entities.extend(device_sensors(coordinator, name, device_id))
+
+    async_add_entities(entities)
+
+    if coordinator.auto_discovery:
+        discovery = CudyRouterDeviceDiscovery(
+            hass, coordinator, name, async_add_entities
         )
-        entities.append(
-            CudyRouterDeviceSensor(coordinator, name, device_id, DEVICE_UPLOAD_SENSOR)
+        config_entry.async_on_unload(
+            coordinator.async_add_listener(discovery.async_update)
         )
-        entities.append(
-            CudyRouterDeviceSensor(coordinator, name, device_id, DEVICE_DOWNLOAD_SENSOR)
+        discovery.async_update()
+
+
+class CudyRouterDeviceDiscovery:
+    """Adds sensors for newly seen devices and marks the ones of idle devices.
+
+    New entities are added in one batch per coordinator refresh. Sensors of
+    idle devices are unavailable instead of being disabled in the registry,
+    as enabling them again would reload the config entry.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        coordinator: CudyRouterDataUpdateCoordinator,
+        name: str,
+        async_add_entities: AddEntitiesCallback,
+    ) -> None:
+        """Initialize."""
+        self.hass = hass
+        self.coordinator = coordinator
+        self.name = name
+        self._async_add_entities = async_add_entities
+        self._idle_timeout = 60 * (
+            coordinator.config_entry.options.get(OPTIONS_IDLE_TIMEOUT)
+            or DEFAULT_IDLE_TIMEOUT
         )
+        # Devices with sensors added since setup, configured ones included
+        self._added: set[str] = set(coordinator.configured_devices)
+        # Sensors of the discovered devices, which can become idle
+        self._sensors: dict[str, list[CudyRouterDeviceSensor]] = {}
 
-    async_add_entities(entities)
+    @callback
+    def async_update(self) -> None:
+        """Applies the device changes of the last refresh."""
+        devices = self.coordinator.data and self.coordinator.data.get(MODULE_DEVICES)
+
+        new_entities: list[CudyRouterDeviceSensor] = []
+        # Devices configured by hostname already have sensors under that name
+        configured = set(devices.hostnames.values()) if devices else set()
+        for device_id in devices.detailed if devices else ():
+            if device_id in self._added or device_id in configured:
+                continue
+            self._added.add(device_id)
+            sensors = device_sensors(self.coordinator, self.name, device_id)
+            self._sensors[device_id] = sensors
+            new_entities.extend(sensors)
+        if new_entities:
+            self._async_add_entities(new_entities)
+
+        now = self.hass.loop.time()
+        for device_id, sensors in self._sensors.items():
+            last_seen = self.coordinator.device_last_seen.get(device_id, now)
+            idle = last_seen < now - self._idle_timeout
+            for sensor in sensors:
+                if sensor.idle != idle:
+                    sensor.idle = idle
+                    # Sensors disabled by the user are not added to hass
+                    if sensor.hass:
+                        sensor.async_write_ha_state()
 
 
 class CudyRouterDeviceSensor(
@@ -312,14 +532,16 @@ class CudyRouterDeviceSensor(
         descriptionTemplate: CudyRouterSensorEntityDescription,
     ) -> None:
         """Initialize the sensor."""
-        super().__init__(coordinator)
+        super().__init__(coordinator, (self._device_value,))
         description = CudyRouterSensorEntityDescription(
             module=descriptionTemplate.module,
             key=descriptionTemplate.key,
             icon=descriptionTemplate.icon,
+            device_class=descriptionTemplate.device_class,
             state_class=descriptionTemplate.state_class,
             entity_category=descriptionTemplate.entity_category,
             native_unit_of_measurement=descriptionTemplate.native_unit_of_measurement,
+            suggested_unit_of_measurement=descriptionTemplate.suggested_unit_of_measurement,
             name_suffix=descriptionTemplate.name_suffix,
         )
         self.entity_description = description
@@ -332,19 +554,29 @@ class CudyRouterDeviceSensor(
             manufacturer="Cudy",
             name=name,
         )
-        self._attr_unique_id = f"{coordinator.config_entry.entry_id}-{self._sensor_name_prefix}-{description.key}"
+        self._attr_unique_id = device_unique_id(
+            coordinator.config_entry.entry_id, device_id, description.key
+        )
+        # Set for discovered devices away for longer than the idle timeout
+        self.idle = False
+
+    @property
+    def available(self) -> bool:
+        """Return if the device was seen recently enough."""
+        return super().available and not self.idle
 
     @property
     def native_value(self) -> StateType:
         """Return the state of the resources."""
-        if not self.coordinator.data:
-            return None
-        device = (
-            self.coordinator.data[MODULE_DEVICES]
-            .get(SECTION_DETAILED)
-            .get(self.device_key)
-        )
-        return device and device.get(self.entity_description.key)
+        return self._device_value(self.coordinator.data)
+
+    def _device_value(self, data: dict[str, Snapshot] | None) -> StateType:
+        """Return the value of the tracked device in the given data."""
+        if self.entity_description.module == MODULE_TRAFFIC:
+            device = self.coordinator.get_device_traffic(self.device_key, data)
+        else:
+            device = self.coordinator.get_device(self.device_key, data)
+        return device and getattr(device, self.entity_description.key)
 
 
 class CudyRouterSensor(
@@ -362,7 +594,14 @@ class CudyRouterSensor(
         description: CudyRouterSensorEntityDescription,
     ) -> None:
         """Initialize the sensor."""
-        super().__init__(coordinator)
+        super().__init__(
+            coordinator,
+            (
+                (description.module, description.key),
+                self._module_attributes,
+                (MODULE_STATISTICS, "metrics", description.key),
+            ),
+        )
         self._sensor_name_prefix = sensor_name_prefix
         self.entity_description = description
         self._attrs: dict[str, Any] = {}
@@ -374,37 +613,70 @@ class CudyRouterSensor(
         )
         self._attr_unique_id = f"{coordinator.config_entry.entry_id}-{sensor_name_prefix}-{description.key}"
 
+    @property
+    def _snapshot(self) -> Snapshot | None:
+        """Return the last data of the module of the sensor."""
+        data = self.coordinator.data
+        return data and data.get(self.entity_description.module)
+
+    @property
+    def available(self) -> bool:
+        """Return if the module of the sensor has data."""
+        return super().available and self._snapshot is not None
+
     @property
     def native_value(self) -> StateType:
         """Return the state of the resources."""
-        if not self.coordinator.data:
-            return None
-        data_entry = self.coordinator.data[self.entity_description.module].get(
-            self.entity_description.key
-        )
-        return data_entry["value"]
+        snapshot = self._snapshot
+        return snapshot and getattr(snapshot, self.entity_description.key)
 
     @property
     def extra_state_attributes(self) -> dict[str, Any]:
         """Return the state attributes."""
-        if self.coordinator.data:
-            attributes = self.coordinator.data[self.entity_description.module][
-                self.entity_description.key
-            ].get("attributes")
-            if attributes:
-                self._attrs.update(attributes)
+        data = self.coordinator.data
+        if data:
+            statistics = data.get(MODULE_STATISTICS)
+            for attributes in (
+                self._module_attributes(data),
+                statistics and statistics.attributes(self.entity_description.key),
+            ):
+                if attributes:
+                    self._attrs.update(attributes)
 
         return self._attrs
 
+    def _module_attributes(
+        self, data: dict[str, Snapshot] | None
+    ) -> dict[str, Any] | None:
+        """Return the state attributes of the module in the given data."""
+        snapshot = data and data.get(self.entity_description.module)
+        return snapshot and snapshot.attributes(self.entity_description.key)
+
 
 class CudyRouterSignalSensor(CudyRouterSensor):
     """Implementation of a Cudy Router sensor with dynamic icon."""
 
-    @callback
-    def async_write_ha_state(self) -> None:
+    def __init__(
+        self,
+        coordinator: CudyRouterDataUpdateCoordinator,
+        name: str | None,
+        sensor_name_prefix: str,
+        description: CudyRouterSensorEntityDescription,
+    ) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator, name, sensor_name_prefix, description)
+        # The icon follows the signal strength
+        self.coordinator_context = (
+            *self.coordinator_context,
+            (MODULE_MODEM, "signal"),
+        )
+
+    @property
+    def icon(self) -> str:
+        """Return the icon matching the signal strength."""
         data = self.coordinator.data
-        modem_data = data and data.get(MODULE_MODEM)
-        value = modem_data.get("signal") and modem_data.get("signal").get("value")
+        modem = data and data.get(MODULE_MODEM)
+        value = modem and modem.signal
         icon = "mdi:network-strength-outline"
         if not value:
             icon = "mdi:network-strength-off-outline"
@@ -416,6 +688,4 @@ class CudyRouterSignalSensor(CudyRouterSensor):
             icon = "mdi:network-strength-3"
         elif value == 4:
             icon = "mdi:network-strength-4"
-        self._attr_icon = icon
-
-        super().async_write_ha_state()
+        return icon
@@ -0,0 +1,198 @@
+"""Traffic of each client of a Cudy router, integrated from the polled speeds"""
+
+from __future__ import annotations
+
+from array import array
+import heapq
+import math
+from typing import Any
+
+from .models import ClientTraffic, DevicesSnapshot
+
+# Speeds are parsed in megabits per second of 1024 * 1024 bits, see parse_speed
+BYTES_PER_MEGABIT = 1024 * 1024 / 8
+
+
+def transferred_bytes(previous_speed: float, speed: float, elapsed: float) -> float:
+    """Returns the bytes transferred between two speed samples, 0 if unknown
+
+    The speed is assumed to change linearly between the samples.
+    """
+
+    average = (previous_speed + speed) / 2
+    if math.isnan(average):
+        return 0.0
+    return average * elapsed * BYTES_PER_MEGABIT
+
+
+class TrafficCounters:
+    """Downloaded and uploaded bytes of every client seen, stored by columns.
+
+    Each client has a row, found by its normalized MAC address. Besides the
+    counters, the rows keep the last speed samples to integrate the next ones
+    and the last known hostname. The totals also count the removed clients.
+    """
+
+    __slots__ = (
+        "rows",
+        "macs",
+        "hostnames",
+        "downloaded",
+        "uploaded",
+        "last_seen",
+        "total_downloaded",
+        "total_uploaded",
+        "_down_speeds",
+        "_up_speeds",
+        "_sampled",
+    )
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self.rows: dict[str, int] = {}
+        self.macs: list[str] = []
+        self.hostnames: list[str | None] = []
+        self.downloaded = array("d")
+        self.uploaded = array("d")
+        # Unix time, as it's kept across restarts
+        self.last_seen = array("d")
+        self.total_downloaded = 0.0
+        self.total_uploaded = 0.0
+        # Last samples, by loop time; restored rows have none
+        self._down_speeds = array("d")
+        self._up_speeds = array("d")
+        self._sampled = array("d")
+
+    def __len__(self) -> int:
+        return len(self.macs)
+
+    def _add_row(
+        self,
+        mac: str,
+        hostname: str | None,
+        downloaded: float = 0.0,
+        uploaded: float = 0.0,
+        last_seen: float = 0.0,
+    ) -> int:
+        row = len(self.macs)
+        self.rows[mac] = row
+        self.macs.append(mac)
+        self.hostnames.append(hostname)
+        self.downloaded.append(downloaded)
+        self.uploaded.append(uploaded)
+        self.last_seen.append(last_seen)
+        self._down_speeds.append(math.nan)
+        self._up_speeds.append(math.nan)
+        self._sampled.append(-math.inf)
+        return row
+
+    def add_samples(
+        self, devices: DevicesSnapshot, now: float, wall_time: float, max_gap: float
+    ) -> None:
+        """Counts the traffic of the clients since their last samples
+
+        Clients not sampled within max_gap seconds, e.g. after being away or
+        after a restart, only get their new sample stored.
+        """
+
+        table = devices.table
+        for mac, device_row in devices.clients.items():
+            row = self.rows.get(mac)
+            if row is None:
+                row = self._add_row(mac, table.hostnames[device_row])
+            down_speed = table.down_speeds[device_row]
+            up_speed = table.up_speeds[device_row]
+            elapsed = now - self._sampled[row]
+            if elapsed <= max_gap:
+                downloaded = transferred_bytes(
+                    self._down_speeds[row], down_speed, elapsed
+                )
+                uploaded = transferred_bytes(self._up_speeds[row], up_speed, elapsed)
+                self.downloaded[row] += downloaded
+                self.uploaded[row] += uploaded
+                self.total_downloaded += downloaded
+                self.total_uploaded += uploaded
+            self._down_speeds[row] = down_speed
+            self._up_speeds[row] = up_speed
+            self._sampled[row] = now
+            self.last_seen[row] = wall_time
+            self.hostnames[row] = table.hostnames[device_row] or self.hostnames[row]
+
+    def top(self, counters: array, count: int) -> list[dict[str, Any]]:
+        """Returns the clients with the largest counters, largest first"""
+
+        return [
+            {
+                "mac": self.macs[row],
+                "hostname": self.hostnames[row],
+                "bytes": round(counters[row]),
+            }
+            for row in heapq.nlargest(
+                count, range(len(counters)), key=counters.__getitem__
+            )
+            if counters[row]
+        ]
+
+    def client(self, mac: str) -> ClientTraffic | None:
+        """Returns the traffic of the client with the normalized MAC address"""
+
+        row = self.rows.get(mac)
+        if row is None:
+            return None
+        return ClientTraffic(round(self.downloaded[row]), round(self.uploaded[row]))
+
+    def remove_idle(self, since: float) -> None:
+        """Removes the clients not seen since the given Unix time"""
+
+        kept = [row for row in range(len(self)) if self.last_seen[row] >= since]
+        if len(kept) == len(self):
+            return
+        pruned = TrafficCounters()
+        for row in kept:
+            new_row = pruned._add_row(
+                self.macs[row],
+                self.hostnames[row],
+                self.downloaded[row],
+                self.uploaded[row],
+                self.last_seen[row],
+            )
+            pruned._down_speeds[new_row] = self._down_speeds[row]
+            pruned._up_speeds[new_row] = self._up_speeds[row]
+            pruned._sampled[new_row] = self._sampled[row]
+        pruned.total_downloaded = self.total_downloaded
+        pruned.total_uploaded = self.total_uploaded
+        for name in self.__slots__:
+            setattr(self, name, getattr(pruned, name))
+
+    def as_dict(self) -> dict[str, Any]:
+        """Returns the counters to be stored, a list for each column
+
+        The lists are copies, as they are serialized in the executor.
+        """
+
+        return {
+            "macs": list(self.macs),
+            "hostnames": list(self.hostnames),
+            "downloaded": [round(value) for value in self.downloaded],
+            "uploaded": [round(value) for value in self.uploaded],
+            "last_seen": [round(value) for value in self.last_seen],
+            "total_downloaded": round(self.total_downloaded),
+            "total_uploaded": round(self.total_uploaded),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> TrafficCounters:
+        """Restores the stored counters"""
+
+        counters = cls()
+        for row in zip(
+            data["macs"],
+            data["hostnames"],
+            data["downloaded"],
+            data["uploaded"],
+            data["last_seen"],
+        ):
+            counters._add_row(*row)
+        counters.total_downloaded = data["total_downloaded"]
+        counters.total_uploaded = data["total_uploaded"]
+        return counters